@@ -1,30 +1,312 @@
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import lru_cache, wraps
 from pathlib import Path
 import re
 
+import atexit
+import hashlib
 import inspect
+import io as iolib
+import json
+import marshal
+import mmap
+import operator
+import os
+import socket
+import stat
 import sys
+import tempfile
+import threading
+import traceback
+import weakref
 
-import customtkinter as ctk
-import tkinter as tk
+import importlib
+import importlib.util
+
+# Modules that `from CapyCompiler import command` must get this running copy,
+# both when run as a script and in a spawned pool worker (where this file is
+# __mp_main__); a second copy would re-run the CLI and have its own context.
+if __name__ in ("__main__", "__mp_main__"):
+    sys.modules.setdefault("CapyCompiler", sys.modules[__name__])
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+# The GUI toolkit is only imported once a script uses capygui, so console
+# scripts start fast and run on machines without display libraries.
+ctk = LazyModule("customtkinter")
+tk = LazyModule("tkinter")
+asyncio = LazyModule("asyncio")
+PILImage = LazyModule("PIL.Image")  # optional; Tk's own PhotoImage reads PNG/GIF without it
 
-Registers = {}
 ver = "1.0.1"
 mode = "release"
 
+# Compiled-script cache (like __pycache__). Bump the format when the
+# serialized instruction layout changes.
+CACHE_DIR = "__capycache__"
+CACHE_FORMAT = 2
+
+# Registers
+#
+# Register names are interned into integer slots (shared by every register
+# file) so compiled code can address them without hashing strings. Values
+# are stored by kind: floats in a packed array('d'), everything else
+# (ints, strings, widgets, ...) in a parallel object list.
+_SLOTS = {}
+_SLOT_NAMES = []
+
+UNSET, NUMBER, OBJECT = 0, 1, 2
+
+
+def parse_number(text: str):
+    # Integers stay integers; anything else goes through float()
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+_SLOTS_LOCK = threading.Lock()
+
+
+def register_slot(name: str) -> int:
+    slot = _SLOTS.get(name)
+    if slot is None:
+        with _SLOTS_LOCK:
+            slot = _SLOTS.get(name)
+            if slot is None:
+                slot = _SLOTS[name] = len(_SLOT_NAMES)
+                _SLOT_NAMES.append(name)
+    return slot
+
+
+def slot_name(slot: int) -> str:
+    return _SLOT_NAMES[slot]
+
+
+class RegisterFile(MutableMapping):
+    """Slot-indexed register storage with a dict-like view keyed by name."""
+
+    def __init__(self):
+        self.kinds = bytearray()
+        self.numbers = array("d")
+        self.objects = []
+
+    def _grow(self, slot):
+        extra = slot + 1 - len(self.kinds)
+        if extra > 0:
+            self.kinds.extend(bytes(extra))
+            self.numbers.extend([0.0] * extra)
+            self.objects.extend([None] * extra)
+
+    # --- Slot access (used by compiled code) ---
+    def load(self, slot, default=None):
+        try:
+            kind = self.kinds[slot]
+        except IndexError:
+            return default
+        if kind == NUMBER:
+            return self.numbers[slot]
+        if kind == OBJECT:
+            return self.objects[slot]
+        return default
+
+    def load_number(self, slot):
+        # Raises KeyError for an unset register
+        try:
+            kind = self.kinds[slot]
+        except IndexError:
+            kind = UNSET
+        if kind == NUMBER:
+            return self.numbers[slot]
+        if kind == OBJECT:
+            value = self.objects[slot]
+            if type(value) is int:
+                return value
+            return parse_number(value) if isinstance(value, str) else float(value)
+        raise KeyError(slot_name(slot))
+
+    def store(self, slot, value):
+        if slot >= len(self.kinds):
+            self._grow(slot)
+        if type(value) is float:
+            self.kinds[slot] = NUMBER
+            self.numbers[slot] = value
+            self.objects[slot] = None
+        else:
+            self.kinds[slot] = OBJECT
+            self.objects[slot] = value
+
+    def is_set(self, slot):
+        return slot < len(self.kinds) and self.kinds[slot] != UNSET
+
+    # --- Mapping view by name ---
+    def __getitem__(self, name):
+        slot = _SLOTS.get(name)
+        if slot is None or not self.is_set(slot):
+            raise KeyError(name)
+        return self.load(slot)
+
+    def __setitem__(self, name, value):
+        self.store(register_slot(name), value)
+
+    def __delitem__(self, name):
+        slot = _SLOTS.get(name)
+        if slot is None or not self.is_set(slot):
+            raise KeyError(name)
+        self.kinds[slot] = UNSET
+        self.objects[slot] = None
+
+    def __contains__(self, name):
+        slot = _SLOTS.get(name)
+        return slot is not None and self.is_set(slot)
+
+    def __iter__(self):
+        return (_SLOT_NAMES[slot] for slot, kind in enumerate(self.kinds) if kind != UNSET)
+
+    def __len__(self):
+        return len(self.kinds) - self.kinds.count(UNSET)
+
+    def clear(self):
+        self.kinds = bytearray(len(self.kinds))
+        self.objects = [None] * len(self.kinds)
+
+    def copy(self):
+        other = RegisterFile()
+        other.kinds = bytearray(self.kinds)
+        other.numbers = array("d", self.numbers)
+        other.objects = self.objects.copy()
+        return other
+
+    def __repr__(self):
+        return f"RegisterFile({dict(self.items())!r})"
+
+
+# Interpreter contexts
+#
+# All per-script state (registers, command table, GUI objects, console
+# buffer, open files) lives on a Context (defined further down). The
+# module-level names below (Registers, CommandMap, Console, capygui.apps,
+# ...) are proxies that forward to the Context active in the calling
+# thread, so modules written against the old globals keep working.
+_active = None  # ContextVar, created once Context exists
+
+
+class ContextProxy:
+    __slots__ = ("_attr",)
+
+    def __init__(self, attr):
+        object.__setattr__(self, "_attr", attr)
+
+    def _target(self):
+        return getattr(_active.get(), self._attr)
+
+    def __getattr__(self, name):
+        return getattr(getattr(_active.get(), self._attr), name)
+
+    def __getitem__(self, key):
+        return self._target()[key]
+
+    def __setitem__(self, key, value):
+        self._target()[key] = value
+
+    def __delitem__(self, key):
+        del self._target()[key]
+
+    def __contains__(self, key):
+        return key in self._target()
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __len__(self):
+        return len(self._target())
+
+    def __bool__(self):
+        return bool(self._target())
+
+    def __repr__(self):
+        return repr(self._target())
+
+
+Registers = ContextProxy("registers")
+
 # Variable resolution (modular)
 _VAR_PATTERN = re.compile(r'\$(\w+)|\$\{([^}]+)\}')
+_MISSING = object()
+
+
+class Template:
+    """An argument string parsed once into literal segments and register slots."""
+
+    __slots__ = ("text", "parts", "slots")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = []  # literal text, with None where a register goes
+        self.slots = []  # (index into parts, register name, register slot)
+        pos = 0
+        for match in _VAR_PATTERN.finditer(text):
+            if match.start() > pos:
+                self.parts.append(text[pos:match.start()])
+            name = match.group(1) or match.group(2)
+            self.slots.append((len(self.parts), name, register_slot(name)))
+            self.parts.append(None)
+            pos = match.end()
+        if pos < len(text):
+            self.parts.append(text[pos:])
+
+    def render(self, registers, undefined_fmt: str = "<undefined:{name}>") -> str:
+        if not self.slots:
+            return self.text
+
+        parts = self.parts.copy()
+        if type(registers) is ContextProxy:
+            registers = registers._target()
+        if type(registers) is RegisterFile:
+            for index, name, slot in self.slots:
+                value = registers.load(slot, _MISSING)
+                if value is _MISSING:
+                    parts[index] = undefined_fmt.format(name=name)
+                else:
+                    parts[index] = str(value)
+        else:
+            for index, name, _ in self.slots:
+                if name in registers:
+                    parts[index] = str(registers[name])
+                else:
+                    parts[index] = undefined_fmt.format(name=name)
+        return "".join(parts)
 
-def resolve_variables(text: str, registers: dict, undefined_fmt: str = "<undefined:{name}>") -> str:
-    if not text:
-        return text
 
-    def _repl(match):
-        name = match.group(1) or match.group(2)
-        if name in registers:
-            return str(registers[name])
-        return undefined_fmt.format(name=name)
+@lru_cache(maxsize=4096)
+def compile_template(text: str) -> Template:
+    return Template(text)
+
 
-    return _VAR_PATTERN.sub(_repl, text)
+def resolve_variables(text: str, registers: dict, undefined_fmt: str = "<undefined:{name}>") -> str:
+    if not text or "$" not in text:
+        return text
+    return compile_template(text).render(registers, undefined_fmt)
 
 
 def set_register_from_arg(arg: str):
@@ -34,6 +316,401 @@ def set_register_from_arg(arg: str):
     # Resolve variables in the value so you can do nested references
     Registers[name] = resolve_variables(value, Registers)
 
+
+# Operand handling
+#
+# Handlers with a `decode_operands` hook receive arguments decoded by the
+# compiler (from the pre-split operands and their `$`-reference flags)
+# instead of the raw argument string. They still accept the raw string so
+# callbacks and modules can keep calling them the old way.
+def split_operands(args):
+    ops = tuple(args.split(" ")) if args else ()
+    return ops, tuple("$" in op for op in ops)
+
+
+def _pass_operands(ops, refs):
+    return ops, refs
+
+
+def operands(func):
+    func.decode_operands = _pass_operands
+    return func
+
+
+def _source_operand(op, ref):
+    # A bare `$name` / `${name}` becomes its register slot, a literal number
+    # becomes a (value, text) tuple, and anything else stays text
+    if ref:
+        match = _VAR_PATTERN.fullmatch(op)
+        if match:
+            return register_slot(match.group(1) or match.group(2))
+        return op
+    try:
+        return (parse_number(op), op)
+    except ValueError:
+        return op
+
+
+def _number(source):
+    kind = type(source)
+    if kind is int:
+        try:
+            return _active.get().registers.load_number(source)
+        except KeyError:
+            source = "$" + slot_name(source)
+    elif kind is tuple:
+        return source[0]
+    return parse_number(resolve_variables(source, Registers))
+
+
+def _text(source):
+    kind = type(source)
+    if kind is int:
+        value = _active.get().registers.load(source, _MISSING)
+        return f"<undefined:{slot_name(source)}>" if value is _MISSING else str(value)
+    if kind is tuple:
+        return source[1]
+    return resolve_variables(source, Registers)
+
+
+def _int(source):
+    value = _number(source)
+    if type(value) is float:
+        if not value.is_integer():
+            raise ValueError(f"{value} is not an integer")
+        value = int(value)
+    return value
+
+
+def _float(source):
+    return float(_number(source))
+
+
+def _bool(source):
+    text = _text(source).strip().lower()
+    if text in ("true", "yes", "on", "1"):
+        return True
+    if text in ("false", "no", "off", "0", ""):
+        return False
+    raise ValueError(f"{text!r} is not true or false")
+
+
+def _const(value):
+    return value
+
+
+# Typed commands
+#
+# A command can declare its operands as annotated parameters instead of
+# parsing a raw string:
+#
+#     @staticmethod
+#     @command
+#     def resize(name: str, width: int, height: int = 0) -> float: ...
+#
+# The compiler splits and decodes the operands once. Literals are converted,
+# and rejected, at compile time. `$name` operands become register slots that
+# are read when the command runs. A return annotation adds a destination
+# register operand that receives the result. OPERAND_TYPES maps annotations
+# to loaders (modules may add their own), and `Register` passes the value
+# stored in a register named by the operand, with or without `$`.
+class Register:
+    pass
+
+
+OPERAND_TYPES = {int: _int, float: _float, bool: _bool, str: _text, inspect.Parameter.empty: _text}
+_PURE_LOADERS = {_int: "an integer", _float: "a number", _number: "a number", _bool: "true or false", _text: "text"}
+
+
+def _register_operand(op, ref):
+    match = _VAR_PATTERN.fullmatch(op) if ref else None
+    return register_slot(match.group(1) or match.group(2) if match else op)
+
+
+def _load_register(slot):
+    value = _active.get().registers.load(slot, _MISSING)
+    if value is _MISSING:
+        raise Exception(f"Register '{slot_name(slot)}' is undefined")
+    return value
+
+
+def _operand_spec(label, annotation, optional=False):
+    # (label, loader, reader, optional) for one parameter
+    if annotation is Register:
+        return label, _load_register, _register_operand, optional
+    if callable(annotation) and annotation not in OPERAND_TYPES and not isinstance(annotation, type):
+        return label, annotation, _source_operand, optional  # a loader used directly
+    try:
+        return label, OPERAND_TYPES[annotation], _source_operand, optional
+    except KeyError:
+        raise TypeError(f"no operand loader for {annotation!r} (add one to OPERAND_TYPES)") from None
+
+
+def typed_handler(op, params, rest=None, returns=False):
+    """
+    Build the command for `op` from one spec per parameter, an optional spec
+    for trailing operands, and whether a destination register comes last.
+    """
+    name = op.__qualname__
+    required = sum(1 for spec in params if not spec[3])
+
+    def decode(ops, refs):
+        dest = None
+        if returns:
+            if not ops:
+                raise Exception(f"{name}: missing destination register")
+            dest = register_slot(ops[-1])
+            ops, refs = ops[:-1], refs[:-1]
+        if len(ops) < required or (rest is None and len(ops) > len(params)):
+            expected = f"{required}+" if rest else (
+                str(required) if required == len(params) else f"{required}-{len(params)}"
+            )
+            plural = "" if expected == "1" else "s"
+            raise Exception(f"{name}: expected {expected} operand{plural}{' and a destination' if returns else ''}, got {len(ops)}")
+        plan = []
+        for i, (operand, ref) in enumerate(zip(ops, refs)):
+            label, load, read, _ = params[i] if i < len(params) else rest
+            source = read(operand, ref)
+            if load in _PURE_LOADERS and not ref and type(source) is not int:
+                try:
+                    source, load = load(source), _const
+                except (ValueError, TypeError):
+                    raise Exception(f"{name}: {label} must be {_PURE_LOADERS[load]}, got {operand!r}") from None
+            plan.append((load, source))
+        return tuple(plan), dest
+
+    @wraps(op)
+    def handler(plan, dest=None):
+        if type(plan) is str:
+            plan, dest = decode(*split_operands(plan))
+        result = op(*[load(source) for load, source in plan])
+        if returns:
+            _active.get().registers.store(dest, result)
+        else:
+            return result
+
+    handler.decode_operands = decode
+    return handler
+
+
+def command(op):
+    """Turn a function with annotated parameters into a typed command."""
+    signature = inspect.signature(op)
+    params, rest = [], None
+    for parameter in signature.parameters.values():
+        spec = _operand_spec(parameter.name, parameter.annotation, parameter.default is not parameter.empty)
+        if parameter.kind is parameter.VAR_POSITIONAL:
+            rest = spec[:3] + (True,)
+        else:
+            params.append(spec)
+    returns = signature.return_annotation not in (signature.empty, None)
+    return typed_handler(op, params, rest, returns)
+
+
+def result_command(*loaders):
+    """
+    Turn `op(*values) -> result` into a command taking one operand per
+    loader followed by a destination register (see typed_handler).
+    """
+    def wrap(op):
+        params = [_operand_spec(f"operand {i + 1}", load) for i, load in enumerate(loaders)]
+        return typed_handler(op, params, returns=True)
+    return wrap
+
+
+def numeric(count):
+    # `count` numeric operands, delivered to `op` as native ints or floats
+    return result_command(*([_number] * count))
+
+
+# Vectors
+#
+# Array registers hold a Vector: a float64 buffer backed by NumPy when it
+# is installed and by array('d') otherwise. Bulk math.v* commands run over
+# the whole buffer in one command.
+np = LazyModule("numpy") if importlib.util.find_spec("numpy") else None
+
+
+class Vector:
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def buffer(self):
+        return memoryview(self.data)
+
+    def __str__(self):
+        return ",".join(map(str, self.data.tolist()))
+
+    def __repr__(self):
+        return f"Vector({self})"
+
+
+def make_vector(values) -> Vector:
+    if np is not None:
+        if isinstance(values, array):
+            return Vector(np.frombuffer(values, dtype=np.float64))
+        return Vector(np.array(values if isinstance(values, np.ndarray) else list(values), dtype=np.float64))
+    return Vector(array("d", values))
+
+
+def _vector(source):
+    kind = type(source)
+    if kind is int:
+        value = _active.get().registers.load(source)
+        if value is None:
+            raise Exception(f"Register '{slot_name(source)}' is undefined")
+    elif kind is tuple:
+        value = source[1]
+    else:
+        value = resolve_variables(source, Registers)
+
+    if isinstance(value, Vector):
+        return value.data
+    if isinstance(value, str):
+        return make_vector(parse_number(x) for x in value.split(",") if x).data
+    if isinstance(value, (list, tuple, array)):
+        return make_vector(value).data
+    if np is not None and isinstance(value, np.ndarray):
+        return value.astype(np.float64, copy=False)
+    raise Exception(f"Expected a vector, got {type(value).__name__}")
+
+
+OPERAND_TYPES[Vector] = _vector  # the float buffer, as math.v* commands get it
+
+
+def _check_lengths(a, b):
+    if len(a) != len(b):
+        raise ValueError(f"vector length mismatch: {len(a)} != {len(b)}")
+
+# Module registry
+#
+# `base.import` of a modules/ file reads the list of commands it exports from
+# a manifest in modules/__capycache__/ instead of importing the module and
+# walking every class with inspect. The manifest is rebuilt when the file's
+# mtime or size changes. Each command starts out as a LazyCommand that
+# imports the module the first time it runs; commands that decode their
+# operands at compile time are bound as soon as a script uses them.
+MANIFEST_FORMAT = 1
+
+
+@lru_cache(maxsize=None)
+def _exports(target, prefix):
+    # (command, function) for the public static methods of a class
+    return tuple(
+        (f"{prefix}.{method_name}", method)
+        for method_name, method in inspect.getmembers(target, inspect.isfunction)
+        if not method_name.startswith("_")
+    )
+
+
+class LazyCommand:
+    __slots__ = ("module", "command", "decoded", "branches", "handler")
+
+    def __init__(self, module, command, decoded=False, branches=False):
+        self.module = module
+        self.command = command
+        self.decoded = decoded
+        self.branches = branches
+        self.handler = None
+
+    def bind(self):
+        if self.handler is None:
+            ModuleRegistry.load(self.module)
+            handler = CommandMap.get(self.command)
+            if handler is None or isinstance(handler, LazyCommand):
+                raise Exception(f"Module '{self.module}' no longer provides {self.command}")
+            self.handler = handler
+        return self.handler
+
+    def __call__(self, *args):
+        return (self.handler or self.bind())(*args)
+
+    def __repr__(self):
+        return f"<LazyCommand {self.command} from modules/{self.module}>"
+
+
+class ModuleRegistry:
+    @staticmethod
+    def path(name):
+        """The source file of modules/<name>, found without importing it."""
+        try:
+            spec = importlib.util.find_spec(f"modules.{name}")
+        except (ImportError, ValueError):
+            return None
+        return spec.origin if spec is not None else None
+
+    @staticmethod
+    def manifest_path(path):
+        path = Path(path)
+        return path.parent / CACHE_DIR / f"{path.stem}.manifest"
+
+    @staticmethod
+    def load(name):
+        """Import modules/<name> and bind its commands."""
+        try:
+            module = __import__(f"modules.{name}", fromlist=[""])
+        except ModuleNotFoundError:
+            raise Exception(f"Module '{name}' not found in globals or modules")
+        commands = []
+        for attr_name in dir(module):
+            attr = getattr(module, attr_name)
+            # Classes imported from elsewhere (e.g. CapyCompiler's) are not its commands
+            if inspect.isclass(attr) and attr.__module__ == module.__name__:
+                commands.extend(_exports(attr, attr_name))
+        CommandMap.update(commands)
+        return commands
+
+    @staticmethod
+    def read_manifest(path):
+        try:
+            stat = os.stat(path)
+            data = ModuleRegistry.manifest_path(path).read_bytes()
+            fmt, cached_ver, mtime, size, entries = marshal.loads(data)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if (fmt, cached_ver, mtime, size) != (MANIFEST_FORMAT, ver, stat.st_mtime_ns, stat.st_size):
+            return None
+        return entries
+
+    @staticmethod
+    def write_manifest(path, commands):
+        entries = tuple(
+            (command, hasattr(handler, "decode_operands"), bool(getattr(handler, "branches", False)))
+            for command, handler in commands
+        )
+        try:
+            stat = os.stat(path)
+            target = ModuleRegistry.manifest_path(path)
+            target.parent.mkdir(exist_ok=True)
+            tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(marshal.dumps((MANIFEST_FORMAT, ver, stat.st_mtime_ns, stat.st_size, entries)))
+            os.replace(tmp, target)
+        except (OSError, ValueError):
+            pass  # best-effort, like the script cache
+
+    @staticmethod
+    def import_module(name):
+        if f"modules.{name}" in sys.modules:
+            ModuleRegistry.load(name)  # already paid for: bind the real handlers
+            return
+        path = ModuleRegistry.path(name)
+        if path is None:
+            raise Exception(f"Module '{name}' not found in globals or modules")
+        entries = ModuleRegistry.read_manifest(path)
+        if entries is None:
+            ModuleRegistry.write_manifest(path, ModuleRegistry.load(name))
+            return
+        CommandMap.update(
+            (command, LazyCommand(name, command, decoded, branches))
+            for command, decoded, branches in entries
+        )
+
+
 # Base
 class base:
     @staticmethod
@@ -41,47 +718,384 @@ class base:
         if name in globals():
             target = globals()[name]
             if inspect.isclass(target):
-                for method_name, method in inspect.getmembers(target, inspect.isfunction):
-                    if method_name.startswith("_"):
-                        continue
-                    CommandMap[f"{name}.{method_name}"] = method
+                hook = getattr(target, "_on_import", None)
+                if hook is not None:
+                    hook()
+                CommandMap.update(_exports(target, name))
                 return
 
+        ModuleRegistry.import_module(name)
+
+    # --- Control flow ---
+    # Labels and loop structure are resolved to instruction indexes when a
+    # script is compiled (see CapyCompiler.link); each handler below returns
+    # the index to continue at, or None to fall through.
+    @staticmethod
+    def _linked(arg):
+        # Unlinked calls (e.g. from a GUI callback) only ever get the raw string
+        if arg is None or isinstance(arg, str):
+            raise Exception("control flow commands can only be used in a compiled script")
+
+    @staticmethod
+    def label(name):
+        pass
+
+    @staticmethod
+    def goto(target):
+        base._linked(target)
+        return target
+
+    @staticmethod
+    def if_(left, compare=None, right=None, target=None):
+        # base.if A OP B LABEL  ->  jump to LABEL when the comparison holds
+        base._linked(compare)
+        a, b = _value(left), _value(right)
         try:
-            module = __import__(f"modules.{name}", fromlist=[""])
-        except ModuleNotFoundError:
-            raise Exception(f"Module '{name}' not found in globals or modules")
+            result = compare(a, b)
+        except TypeError:
+            result = compare(str(a), str(b))
+        return target if result else None
 
-        for attr_name in dir(module):
-            attr = getattr(module, attr_name)
-            if inspect.isclass(attr):
-                for method_name, method in inspect.getmembers(attr, inspect.isfunction):
-                    if method_name.startswith("_"):
-                        continue
-                    CommandMap[f"{attr_name}.{method_name}"] = method
+    @staticmethod
+    def repeat(count, state=None, index=None, exit_=None):
+        # base.repeat N [REG] ... base.end
+        base._linked(exit_)
+        n = _number(count)
+        state.i, state.n = 0, n
+        if n <= 0:
+            return exit_
+        if index is not None:
+            _active.get().registers.store(index, 0)
+        return None
+
+    @staticmethod
+    def while_(left, compare=None, right=None, exit_=None):
+        # base.while A OP B ... base.end
+        base._linked(exit_)
+        if base.if_(left, compare, right, True) is None:
+            return exit_
+        return None
+
+    @staticmethod
+    def end(body, state=None, index=None):
+        # `body` is the first instruction inside the loop
+        base._linked(body)
+        if state is None:
+            # while: go back and re-test
+            return body - 1
+        i = state.i + 1
+        if i >= state.n:
+            return None
+        state.i = i
+        if index is not None:
+            _active.get().registers.store(index, i)
+        return body
+
+    @staticmethod
+    def break_(target):
+        base._linked(target)
+        return target
+
+    @staticmethod
+    def continue_(target):
+        base._linked(target)
+        return target
+
+    # --- Background tasks ---
+    # base.spawn REG <command> [args] runs any command on a worker thread and
+    # leaves its future in REG; base.await / base.wait_all join them. Tasks
+    # see the spawning script's context, so they read and write its registers.
+    @staticmethod
+    def spawn(dest, instruction=None):
+        if instruction is None:
+            dest, instruction = _decode_spawn(*split_operands(dest))
+        context = _active.get()
+        task = _task_pool().submit(copy_context().run, instruction.execute)
+        context.tasks.append(task)
+        context.registers.store(dest, task)
+
+    @staticmethod
+    def await_(task, dest=None):
+        # base.await $REG [DEST]  ->  wait for the task, re-raising its error
+        if isinstance(task, str):
+            task, dest = _decode_await(*split_operands(task))
+        from concurrent.futures import Future
+        future = _value(task)
+        if not isinstance(future, Future):
+            raise Exception(f"base.await: {future!r} is not a spawned task")
+        try:
+            _active.get().tasks.remove(future)
+        except ValueError:
+            pass  # already joined
+        result = future.result()
+        if dest is not None:
+            _active.get().registers.store(dest, result)
+
+    @staticmethod
+    def wait_all(arg=""):
+        _active.get().join_tasks()
+
+
+for _flow in (base.label, base.goto, base.if_, base.repeat, base.while_, base.end, base.break_, base.continue_):
+    _flow.branches = True
+
+_COMPARISONS = {
+    "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+}
+
+
+def _value(source):
+    # A decoded operand as a number when it looks like one, else as text
+    kind = type(source)
+    if kind is tuple:
+        return source[0]
+    if kind is int:
+        value = _active.get().registers.load(source, _MISSING)
+        if value is _MISSING:
+            return f"<undefined:{slot_name(source)}>"
+    else:
+        value = resolve_variables(source, Registers)
+    if isinstance(value, str):
+        try:
+            return parse_number(value)
+        except ValueError:
+            return value
+    return value
+
+
+OPERAND_TYPES[object] = _value  # a number when it looks like one, else the stored value or text
+
+
+TASK_THREADS = int(os.environ.get("CAPY_THREADS", 0)) or None  # None: ThreadPoolExecutor's default
+_task_executor = None
+_TASK_LOCK = threading.Lock()
+
+
+def _task_pool():
+    # Created on first spawn so scripts that never use tasks don't import concurrent.futures
+    global _task_executor
+    if _task_executor is None:
+        with _TASK_LOCK:
+            if _task_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _task_executor = ThreadPoolExecutor(TASK_THREADS, thread_name_prefix="capy-task")
+    return _task_executor
+
+
+def _decode_spawn(ops, refs):
+    if len(ops) < 2:
+        raise Exception("usage: base.spawn <register> <command> [args]")
+    command, argument = ops[1], " ".join(ops[2:])
+    handler = CommandMap.get(command)
+    if handler is None:
+        raise Exception("Unknown command: " + command)
+    if getattr(handler, "branches", False) or handler is base.importmod or handler is base.spawn:
+        raise Exception(f"base.spawn: {command} can't run as a task")
+    if command.startswith("capygui."):
+        # Tk is single-threaded; widgets may only be touched from the interpreter thread
+        raise Exception(f"base.spawn: {command} must run on the interpreter thread")
+    return register_slot(ops[0]), Instruction(command, handler, argument, 0, ops[2:], refs[2:])
+
+
+def _decode_await(ops, refs):
+    if not ops:
+        raise Exception("usage: base.await <$register> [dest]")
+    return _source_operand(ops[0], refs[0]), (register_slot(ops[1]) if len(ops) > 1 else None)
+
+
+base.spawn.decode_operands = _decode_spawn
+base.await_.decode_operands = _decode_await
 
 
 # Command Mappings
-CommandMap = {
-    "base.import": base.importmod
+# Commands available before any import; every Context starts from these
+_BASE_COMMANDS = {
+    "base.import": base.importmod,
+    "base.label": base.label,
+    "base.goto": base.goto,
+    "base.if": base.if_,
+    "base.repeat": base.repeat,
+    "base.while": base.while_,
+    "base.end": base.end,
+    "base.break": base.break_,
+    "base.continue": base.continue_,
+    "base.spawn": base.spawn,
+    "base.await": base.await_,
+    "base.wait_all": base.wait_all,
 }
 
+CommandMap = ContextProxy("commands")
+
+# Console output
+#
+# io.write goes through one buffer instead of a print() per line. It is
+# flushed when it fills up, at the end of a script, before io.read prompts,
+# after GUI callbacks and on io.flush. Interactive terminals get line
+# buffering so output still shows up as it is written. While a script runs,
+# sys.stdout is a ConsoleStream, so print() from modules/ joins the same
+# buffer and comes out in order with io.write.
+class ConsoleOutput:
+    def __init__(self, size=64 * 1024, line_buffered=None, stream=None):
+        self.size = size
+        self.line_buffered = line_buffered  # None: decide by isatty()
+        self.stream = stream  # None: whatever sys.stdout is at the time
+        self._parts = []
+        self._pending = 0
+        self._stream = None
+        self._line_mode = False
+        self._lock = threading.RLock()  # spawned tasks write too
+
+    def configure(self, size=None, line_buffered=None):
+        self.flush()
+        if size is not None:
+            self.size = size
+        self.line_buffered = line_buffered
+        self._stream = None
+
+    def _target(self):
+        # Follows sys.stdout so redirection (e.g. the --serve writer) keeps working
+        stream = self.stream or _real_stdout()
+        if stream is not self._stream:
+            self.flush()
+            self._stream = stream
+            if self.line_buffered is None:
+                try:
+                    self._line_mode = stream.isatty()
+                except (AttributeError, ValueError):
+                    self._line_mode = False
+            else:
+                self._line_mode = self.line_buffered
+        return stream
+
+    def write(self, text):
+        with self._lock:
+            self._target()
+            self._parts.append(text)
+            self._pending += len(text)
+            if self._pending >= self.size or (self._line_mode and "\n" in text):
+                self.flush()
+
+    def flush(self):
+        if not self._parts:
+            return
+        with self._lock:
+            data = "".join(self._parts)
+            self._parts.clear()
+            self._pending = 0
+            stream = self._stream or self.stream or _real_stdout()
+            try:
+                stream.write(data)
+                stream.flush()
+            except ValueError:
+                pass  # stream closed underneath us (interpreter shutdown)
+
+
+Console = ContextProxy("console")
+atexit.register(lambda: Console.flush())
+
+
+class ConsoleStream(iolib.TextIOBase):
+    """
+    Stands in for sys.stdout while scripts run. Writes from a thread that is
+    running a script go into that script's Console; anything else passes
+    straight through to the real stream.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if _console_run.get():
+            Console.write(text)
+        else:
+            self.inner.write(text)
+        return len(text)
+
+    def flush(self):
+        if _console_run.get():
+            Console.flush()
+        else:
+            self.inner.flush()
+
+    def isatty(self):
+        return self.inner.isatty()
+
+    def fileno(self):
+        return self.inner.fileno()
+
+    @property
+    def encoding(self):
+        return self.inner.encoding
+
+
+# Set while the current thread (or a task it spawned) runs a script
+_console_run = ContextVar("capy_console_run", default=False)
+_console_runs = 0  # scripts running in any thread
+_console_lock = threading.Lock()
+
+
+def _real_stdout():
+    stream = sys.stdout
+    return stream.inner if isinstance(stream, ConsoleStream) else stream
+
+
+@contextmanager
+def console_stdout():
+    # The first run installs one shared ConsoleStream and the last one to
+    # finish takes it down, so concurrent contexts never unwrap each other
+    global _console_runs
+    with _console_lock:
+        if not isinstance(sys.stdout, ConsoleStream):
+            sys.stdout = ConsoleStream(sys.stdout)
+        _console_runs += 1
+    token = _console_run.set(True)
+    try:
+        yield
+    finally:
+        _console_run.reset(token)
+        with _console_lock:
+            _console_runs -= 1
+            if _console_runs == 0 and isinstance(sys.stdout, ConsoleStream):
+                sys.stdout = sys.stdout.inner
+
+
 # Console Manipulation
 class io:
     @staticmethod
     def write(text: str):
         processed = resolve_variables(text, Registers)
-        print(processed)
+        Console.write(processed + "\n")
 
     @staticmethod
-    def clear():
-        print("\033c", end="")
+    def clear(arg: str = ""):
+        Console.write("\033c")
+
+    @staticmethod
+    def flush(arg: str = ""):
+        Console.flush()
+
+    @staticmethod
+    def buffer(arg: str):
+        # io.buffer <chars> | io.buffer line | io.buffer auto
+        setting = resolve_variables(arg.strip(), Registers)
+        if setting == "line":
+            Console.configure(line_buffered=True)
+        elif setting == "auto":
+            Console.configure(line_buffered=None)
+        else:
+            Console.configure(size=max(int(setting), 0), line_buffered=False)
 
     @staticmethod
     def read(arg: str):
         parts = arg.split(" ", 1)
         name = parts[0] if parts else ""
         prompt = parts[1] if len(parts) > 1 else ""
+        Console.flush()
         Registers[name] = input(prompt)
 
     @staticmethod
@@ -92,96 +1106,857 @@ class io:
 # Math
 class math:
     @staticmethod
-    def add(args):
-        args = args.split(" ")
-        target1, target2, dest = args[0], args[1], args[2]
-        val1 = float(resolve_variables(target1, Registers))
-        val2 = float(resolve_variables(target2, Registers))
-        Registers[dest] = val1 + val2
+    @numeric(2)
+    def add(val1, val2):
+        return val1 + val2
 
     @staticmethod
-    def sub(args):
-        args = args.split(" ")
-        target1, target2, dest = args[0], args[1], args[2]
-        val1 = float(resolve_variables(target1, Registers))
-        val2 = float(resolve_variables(target2, Registers))
-        Registers[dest] = val1 - val2
+    @numeric(2)
+    def sub(val1, val2):
+        return val1 - val2
 
     @staticmethod
-    def mul(args):
-        args = args.split(" ")
-        target1, target2, dest = args[0], args[1], args[2]
-        val1 = float(resolve_variables(target1, Registers))
-        val2 = float(resolve_variables(target2, Registers))
-        Registers[dest] = val1 * val2
+    @numeric(2)
+    def mul(val1, val2):
+        return val1 * val2
 
     @staticmethod
-    def div(args):
-        args = args.split(" ")
-        target1, target2, dest = args[0], args[1], args[2]
-        val1 = float(resolve_variables(target1, Registers))
-        val2 = float(resolve_variables(target2, Registers))
-        if val2 == 0:
-            Registers[dest] = 0
-
-        Registers[dest] = val1 / val2
+    @numeric(2)
+    def div(val1, val2):
+        return val1 / val2
 
     @staticmethod
-    def pow(args):
-        args = args.split(" ")
-        base_val, exponent, dest = args[0], args[1], args[2]
-        val1 = float(resolve_variables(base_val, Registers))
-        val2 = float(resolve_variables(exponent, Registers))
-        Registers[dest] = val1 ** val2
+    @numeric(2)
+    def pow(val1, val2):
+        return val1 ** val2
 
     @staticmethod
-    def sqrt(args):
-        args = args.split(" ")
-        value, dest = args[0], args[1]
-        val = float(resolve_variables(value, Registers))
-        Registers[dest] = val ** 0.5
+    @numeric(1)
+    def sqrt(val):
+        return val ** 0.5
 
     @staticmethod
-    def mod(args):
-        args = args.split(" ")
-        target1, target2, dest = args[0], args[1], args[2]
-        val1 = float(resolve_variables(target1, Registers))
-        val2 = float(resolve_variables(target2, Registers))
-        Registers[dest] = val1 % val2
+    @numeric(2)
+    def mod(val1, val2):
+        return val1 % val2
 
     @staticmethod
-    def pi(args):
-        args = args.split(" ")
+    @operands
+    def pi(args, refs=None):
+        if isinstance(args, str):
+            args = args.split(" ")
         dest, digits = args[0], int(args[1])
         from math import pi
         Registers[dest] = round(pi, int(digits))
 
+    # --- Vectors ---
+    @staticmethod
+    @result_command(_vector)
+    def vector(values):
+        # math.vector 1,2,3 V  (also copies an existing vector: math.vector $A V)
+        return Vector(values.copy() if np is not None else array("d", values))
+
+    @staticmethod
+    @numeric(1)
+    def vrange(count):
+        # math.vrange 5 V  ->  0,1,2,3,4
+        if np is not None:
+            return Vector(np.arange(count, dtype=np.float64))
+        return Vector(array("d", range(int(count))))
+
+    @staticmethod
+    @numeric(2)
+    def vfill(count, value):
+        # math.vfill 5 1.5 V
+        if np is not None:
+            return Vector(np.full(int(count), value, dtype=np.float64))
+        return Vector(array("d", [value]) * int(count))
+
+    @staticmethod
+    @result_command(_vector)
+    def vlen(a):
+        return len(a)
+
+    @staticmethod
+    @result_command(_vector, _number)
+    def vget(a, index):
+        return float(a[int(index)])
+
+    @staticmethod
+    @operands
+    def vset(args, refs=None):
+        # math.vset $V index value  (in place)
+        if isinstance(args, str):
+            args, refs = split_operands(args)
+        name, index, value = [_source_operand(op, ref) for op, ref in zip(args[:3], refs[:3])]
+        _vector(name)[int(_number(index))] = float(_number(value))
+
+    @staticmethod
+    @result_command(_vector, _vector)
+    def vadd(a, b):
+        _check_lengths(a, b)
+        if np is not None:
+            return Vector(a + b)
+        return Vector(array("d", map(operator.add, a, b)))
+
+    @staticmethod
+    @result_command(_vector, _vector)
+    def vmul(a, b):
+        _check_lengths(a, b)
+        if np is not None:
+            return Vector(a * b)
+        return Vector(array("d", map(operator.mul, a, b)))
+
+    @staticmethod
+    @result_command(_vector, _number)
+    def vscale(a, k):
+        if np is not None:
+            return Vector(a * k)
+        return Vector(array("d", map(float(k).__mul__, a)))
+
+    @staticmethod
+    @result_command(_vector, _vector)
+    def vdot(a, b):
+        _check_lengths(a, b)
+        if np is not None:
+            return float(np.dot(a, b))
+        return float(sum(map(operator.mul, a, b)))
+
+    @staticmethod
+    @result_command(_vector)
+    def vsum(a):
+        return float(a.sum()) if np is not None else float(sum(a))
+
+    @staticmethod
+    @result_command(_vector)
+    def vmin(a):
+        return float(a.min()) if np is not None else min(a)
+
+    @staticmethod
+    @result_command(_vector)
+    def vmax(a):
+        return float(a.max()) if np is not None else max(a)
+
+
+import time as t
+
+# Time
+class time:
+    @staticmethod
+    @command
+    def sleep(seconds: float):
+        scheduler = _active.get().scheduler
+        if scheduler is not None:
+            scheduler.sleep(seconds)  # keeps open windows and timers running
+        else:
+            t.sleep(seconds)
+
+    @staticmethod
+    @command
+    def time() -> int:
+        # time.time DEST
+        return int(t.time())
+
+    @staticmethod
+    @command
+    def ctime(seconds: Register) -> str:
+        # time.ctime A DEST  (A names the register holding the time)
+        return t.ctime(int(float(seconds)))
+
+    @staticmethod
+    @command
+    def localtime() -> object:
+        # time.localtime DEST
+        return t.localtime()
+
+
+# File I/O
+#
+# Files are opened into register handles and read as a stream, one line or
+# one fixed-size chunk per command, so memory stays flat however large the
+# file is. file.map memory-maps a file and file.slice stores zero-copy views
+# of it in registers. Writes go through a large buffered writer.
+WRITE_BUFFER = 1 << 20
+
+
+class FileHandle:
+    __slots__ = ("path", "stream", "__weakref__")
+
+    def __init__(self, path, stream):
+        self.path = path
+        self.stream = stream
+
+    def close(self):
+        self.stream.close()
+
+    def __str__(self):
+        return f"<file {self.path}>"
+
+
+class MappedFile:
+    __slots__ = ("path", "_file", "map", "view", "__weakref__")
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise Exception(f"cannot map empty file '{path}'")
+        self.view = memoryview(self.map)
+
+    def close(self):
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            return  # slices still reference the map; it closes when they go
+        self._file.close()
+
+    def __len__(self):
+        return len(self.map)
+
+    def __str__(self):
+        return f"<mapped file {self.path}>"
+
+
+class MappedSlice:
+    """A zero-copy view into a mapped file; decoded as UTF-8 only when printed."""
+
+    __slots__ = ("view",)
+
+    def __init__(self, view):
+        self.view = view
+
+    def buffer(self):
+        return self.view
+
+    def __len__(self):
+        return len(self.view)
+
+    def __bytes__(self):
+        return self.view.tobytes()
+
+    def __str__(self):
+        return str(self.view, "utf-8", "replace")
+
+
+def _open_file(arg, kind, *args, **kwargs):
+    parts = arg.split(" ", 1)
+    name = parts[0]
+    path = resolve_variables(parts[1], Registers).strip() if len(parts) > 1 else ""
+    if not name or not path:
+        raise Exception(f"usage: file.{kind} <register> <path>")
+    handle = FileHandle(path, open(path, *args, **kwargs)) if kind != "map" else MappedFile(path)
+    _active.get().files.add(handle)
+    Registers[name] = handle
+
+
+def _file_handle(source, kind=FileHandle):
+    if type(source) is int:
+        value = Registers.load(source)
+    else:
+        value = Registers.get(resolve_variables(source, Registers))
+    if not isinstance(value, kind):
+        raise Exception(f"{source if type(source) is str else '$' + slot_name(source)} is not an open file")
+    return value
+
+
+def _mapped(source):
+    return _file_handle(source, MappedFile)
+
+
+def _file_handle_any(source):
+    return _file_handle(source, (FileHandle, MappedFile))
+
+
+OPERAND_TYPES.update({FileHandle: _file_handle, MappedFile: _mapped})
+
+
+def close_files(context=None):
+    files = (context or _active.get()).files
+    for handle in list(files):
+        try:
+            handle.close()
+        except Exception:
+            pass
+    files.clear()
+
+
+atexit.register(close_files)
+
+
+class file:
+    # --- Opening ---
+    @staticmethod
+    def open(arg: str):
+        # file.open F path  (read)
+        _open_file(arg, "open", "r", encoding="utf-8", errors="replace")
+
+    @staticmethod
+    def create(arg: str):
+        # file.create F path  (write, truncating)
+        _open_file(arg, "create", "w", encoding="utf-8", buffering=WRITE_BUFFER)
+
+    @staticmethod
+    def append(arg: str):
+        _open_file(arg, "append", "a", encoding="utf-8", buffering=WRITE_BUFFER)
+
+    @staticmethod
+    def map(arg: str):
+        # file.map M path  (read-only memory map)
+        _open_file(arg, "map")
+
+    @staticmethod
+    @operands
+    def close(args, refs=None):
+        if isinstance(args, str):
+            args, refs = split_operands(args)
+        value = _file_handle(_source_operand(args[0], refs[0]), (FileHandle, MappedFile))
+        value.close()
+        _active.get().files.discard(value)
+
+    # --- Streaming reads ---
+    @staticmethod
+    @operands
+    def readline(args, refs=None):
+        # file.readline $F DEST [MORE]  -- MORE is 1 if a line was read, 0 at end of file
+        if isinstance(args, str):
+            args, refs = split_operands(args)
+        line = _file_handle(_source_operand(args[0], refs[0])).stream.readline()
+        Registers[args[1]] = line.rstrip("\r\n")
+        if len(args) > 2:
+            Registers[args[2]] = 1 if line else 0
+
+    @staticmethod
+    @operands
+    def read(args, refs=None):
+        # file.read $F SIZE DEST [MORE]  -- next chunk of up to SIZE characters
+        if isinstance(args, str):
+            args, refs = split_operands(args)
+        handle = _file_handle(_source_operand(args[0], refs[0]))
+        chunk = handle.stream.read(int(_number(_source_operand(args[1], refs[1]))))
+        Registers[args[2]] = chunk
+        if len(args) > 3:
+            Registers[args[3]] = 1 if chunk else 0
+
+    # --- Buffered writes ---
+    @staticmethod
+    def write(arg: str):
+        # file.write $F text  (adds a newline, like io.write)
+        file.put(arg, "\n")
+
+    @staticmethod
+    def put(arg: str, end: str = ""):
+        # file.put $F text  (no newline)
+        parts = arg.split(" ", 1)
+        handle = _file_handle(_source_operand(parts[0], "$" in parts[0]))
+        text = resolve_variables(parts[1], Registers) if len(parts) > 1 else ""
+        handle.stream.write(text + end)
+
+    @staticmethod
+    @operands
+    def flush(args, refs=None):
+        if isinstance(args, str):
+            args, refs = split_operands(args)
+        _file_handle(_source_operand(args[0], refs[0])).stream.flush()
+
+    # --- Memory-mapped access ---
+    @staticmethod
+    @result_command(_mapped, _number, _number)
+    def slice(mapped, start, length):
+        # file.slice $M START LENGTH DEST
+        start = int(start)
+        return MappedSlice(mapped.view[start:start + int(length)])
+
+    @staticmethod
+    @result_command(_mapped, _text, _number)
+    def find(mapped, needle, start):
+        # file.find $M needle START DEST  -- byte offset, or -1
+        return mapped.map.find(needle.encode("utf-8"), int(start))
+
+    @staticmethod
+    @result_command(_file_handle_any)
+    def size(value):
+        # file.size $F DEST  -- size in bytes
+        if isinstance(value, MappedFile):
+            return len(value)
+        return os.fstat(value.stream.fileno()).st_size
+
+
+# GUI callbacks
+#
+# Button, bind and timer commands are compiled once, when the widget or timer
+# is created, exactly like script lines: handlers are looked up and register
+# operands decoded then, so an event only reads register slots. A body can
+# hold several commands separated by `;`, including loops and labels.
+class Callback:
+    __slots__ = ("source", "program", "suspends")
+
+    def __init__(self, source):
+        self.source = source
+        compiler = CapyCompiler(_active.get())
+        compiler.source = f"<callback {source[:40]}>"
+        self.program = compiler.compile_lines(source.split(";"))
+        # Bodies that sleep run as scheduler tasks so the window keeps responding
+        self.suspends = any(ins.handler is time.sleep for ins in self.program)
+
+    def __call__(self, event=None):
+        if self.suspends:
+            capygui._scheduler().dispatch(self)
+            return
+        try:
+            CapyCompiler._run(self.program)
+        except Exception:
+            pass
+        Console.flush()
+
+    async def run_async(self):
+        program = self.program
+        pc = 0
+        end = len(program)
+        try:
+            while pc < end:
+                ins = program[pc]
+                pc += 1
+                if ins.handler is time.sleep:
+                    (load, source), = ins.args[0]
+                    await asyncio.sleep(load(source))
+                elif ins.branches:
+                    target = ins.execute()
+                    if target is not None:
+                        pc = target
+                else:
+                    ins.execute()
+        except Exception:
+            pass
+        Console.flush()
+
+    def __repr__(self):
+        return f"<Callback {self.source!r}>"
+
+
+# GUI scheduler
+#
+# Windows are driven from one asyncio loop per context instead of a blocking
+# mainloop(): a pump task processes Tk events every `interval` seconds, and
+# button/bind callbacks and capygui.after/every timers run as tasks on the
+# same loop. The loop runs whenever the script waits on it (capygui.host,
+# and time.sleep once a scheduler exists), so a script can keep working
+# after opening a window, and a time.sleep inside a callback only pauses
+# that callback.
+#
+# Widget updates (set/configure/insert) are coalesced per frame: repeated
+# updates of one widget collapse into the last state, and the queue is
+# applied at most `fps` times a second from Tk's after_idle, before each
+# pump, and before capygui.get reads a widget back.
+class GuiScheduler:
+    interval = 0.01
+    fps = 60.0
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.get_ident()
+        self.timers = {}
+        self.pending = {}  # id(widget) -> (widget, [[kind, payload], ...])
+        self._last_frame = 0.0
+        self._flush_scheduled = False
+        self._pump_task = None
+        # Cancels whatever is still scheduled when the context resets or Python exits
+        self.close = weakref.finalize(self, GuiScheduler._shutdown, self.loop)
+
+    def pump(self):
+        """Process pending Tk events for every open window."""
+        if self.pending:
+            self.flush()
+        for name, app in list(capygui.apps.items()):
+            try:
+                app.update()
+            except tk.TclError:
+                capygui.apps.pop(name, None)  # the window was closed
+
+    def defer(self, el, kind, payload):
+        ops = self.pending.setdefault(id(el), (el, []))[1]
+        last = ops[-1] if ops else None
+        if last is None or last[0] != kind:
+            ops.append([kind, payload])
+        elif kind == "set":
+            last[1] = payload
+        elif kind == "configure":
+            last[1] = ({**last[1][0], **payload[0]},)
+        elif kind == "insert" and payload[0] == "end" and last[1][0] == "end":
+            last[1] = ("end", last[1][1] + payload[1])
+        else:
+            ops.append([kind, payload])
+        if not self._flush_scheduled:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        root = next(iter(capygui.apps.values()), None)
+        delay = max(int((self._last_frame + 1 / self.fps - t.monotonic()) * 1000), 0)
+        try:
+            root.after(delay, lambda: root.after_idle(self.flush))
+            self._flush_scheduled = True
+        except Exception:
+            self.flush()
+
+    def frame_due(self):
+        return t.monotonic() - self._last_frame >= 1 / self.fps
+
+    def flush(self):
+        """Apply every queued widget update."""
+        self._flush_scheduled = False
+        self._last_frame = t.monotonic()
+        pending, self.pending = self.pending, {}
+        for el, ops in pending.values():
+            for kind, payload in ops:
+                try:
+                    getattr(capygui, "_apply_" + kind)(el, *payload)
+                except Exception:
+                    pass
+
+    async def _pump_tk(self):
+        while True:
+            self.pump()
+            await asyncio.sleep(self.interval)
+
+    def run(self, awaitable):
+        """Run the loop, and with it Tk and all timers, until `awaitable` is done."""
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = self.loop.create_task(self._pump_tk())
+        return self.loop.run_until_complete(awaitable)
+
+    def sleep(self, seconds):
+        if threading.get_ident() != self.thread:
+            t.sleep(seconds)  # a spawned task; the loop belongs to the interpreter thread
+        elif self.loop.is_running():
+            # Called from inside a running callback: keep the windows responsive by hand
+            deadline = t.monotonic() + seconds
+            while (remaining := deadline - t.monotonic()) > 0:
+                self.pump()
+                t.sleep(min(self.interval, remaining))
+        else:
+            self.run(asyncio.sleep(seconds))
+
+    async def _wait_closed(self, name):
+        while name in capygui.apps:
+            await asyncio.sleep(self.interval)
+
+    def host(self, name):
+        self.run(self._wait_closed(name))
+        if not capygui.apps:
+            # Last window closed: stop the pump and any timers still waiting
+            self.timers.clear()
+            self._pump_task = None
+            GuiScheduler._cancel_all(self.loop)
+
+    def dispatch(self, callback):
+        """Run a Callback as a task on the loop."""
+        if self.loop.is_running():
+            self.loop.create_task(callback.run_async())
+        else:
+            self.run(callback.run_async())
+
+    def after(self, ms, callback, name=None, repeat=False):
+        async def timer():
+            while True:
+                await asyncio.sleep(ms / 1000)
+                await callback.run_async()
+                if not repeat:
+                    break
+
+        self.cancel(name)
+        task = self.loop.create_task(timer())
+        if name is not None:
+            self.timers[name] = task
+
+    def cancel(self, name):
+        task = self.timers.pop(name, None)
+        if task is not None:
+            task.cancel()
+
+    @staticmethod
+    def _cancel_all(loop):
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        if tasks and not loop.is_running():
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+    @staticmethod
+    def _shutdown(loop):
+        if not loop.is_closed():
+            GuiScheduler._cancel_all(loop)
+            loop.close()
+
+
+# Virtualized rows
+#
+# capygui.List / capygui.Table keep one row of labels per visible line and
+# relabel them as the view scrolls, so memory and redraw cost depend on the
+# height of the widget, not on the number of rows. Rows come from a register
+# (a list, a Vector or newline-separated text) and are only copied once the
+# widget itself is edited.
+class VirtualList:
+    def __init__(self, parent, rows=20, columns=None, row_height=24, sep=",", command=None, **kw):
+        self.frame = ctk.CTkFrame(parent, **kw)
+        self.data = []
+        self.top = 0
+        self.selected = None
+        self.visible = max(int(rows), 1)
+        self.columns = columns
+        self.sep = sep
+        self.command = command
+        self._owned = True
+        width = len(columns) if columns else 1
+        self._blank = ("",) * width
+        self._shown = [None] * self.visible
+
+        first = 0
+        if columns:
+            for c, title in enumerate(columns):
+                ctk.CTkLabel(self.frame, text=title, anchor="w").grid(row=0, column=c, sticky="ew", padx=4)
+            first = 1
+        self.cells = []
+        for r in range(self.visible):
+            labels = []
+            for c in range(width):
+                label = ctk.CTkLabel(self.frame, text="", anchor="w", height=row_height)
+                label.grid(row=first + r, column=c, sticky="ew", padx=4)
+                label.bind("<Button-1>", lambda event, r=r: self._on_click(r))
+                self._bind_wheel(label)
+                labels.append(label)
+            self.cells.append(labels)
+        for c in range(width):
+            self.frame.grid_columnconfigure(c, weight=1)
+        self.scrollbar = ctk.CTkScrollbar(self.frame, command=self._on_scrollbar)
+        self.scrollbar.grid(row=first, column=width, rowspan=self.visible, sticky="ns")
+        self._bind_wheel(self.frame)
+
+    def __getattr__(self, name):
+        # pack/grid/place/configure/destroy/bind... act on the outer frame
+        if name == "frame":
+            raise AttributeError(name)
+        return getattr(self.frame, name)
+
+    # --- Data ---
+    def _as_rows(self, value):
+        if isinstance(value, Vector):
+            return value.data
+        if isinstance(value, (list, tuple)):
+            return value
+        if isinstance(value, str):
+            return value.splitlines() if value else []
+        return str(value).splitlines()
+
+    def _own(self):
+        # Copy a borrowed source before editing it in place
+        if not self._owned:
+            self.data = list(self.data)
+            self._owned = True
+
+    def set(self, value):
+        self.data = self._as_rows(value)
+        self._owned = self.data is not value and isinstance(self.data, list)
+        self.top = 0
+        self.selected = None
+        self.render()
+
+    def insert(self, index, value):
+        rows = self._as_rows(value)
+        self._own()
+        position = len(self.data) if str(index) == "end" else int(index)
+        self.data[position:position] = rows
+        self.render()
+
+    def delete(self, start, end=None):
+        # Removes rows start..end inclusive
+        self._own()
+        start = int(start)
+        stop = len(self.data) if end in (None, "end") else int(end) + 1
+        del self.data[start:stop]
+        self.selected = None
+        self.render()
+
+    def get(self):
+        if self.selected is None or self.selected >= len(self.data):
+            return ""
+        row = self.data[self.selected]
+        if self.columns and not isinstance(row, str):
+            return self.sep.join(map(str, row))
+        return str(row)
+
+    def __len__(self):
+        return len(self.data)
+
+    # --- View ---
+    def _row_texts(self, index):
+        row = self.data[index]
+        if not self.columns:
+            return (str(row),)
+        cells = row.split(self.sep) if isinstance(row, str) else [str(cell) for cell in row]
+        width = len(self.columns)
+        return tuple(cells[:width]) + ("",) * (width - len(cells))
+
+    def render(self):
+        total = len(self.data)
+        self.top = max(0, min(self.top, total - self.visible))
+        for i, labels in enumerate(self.cells):
+            index = self.top + i
+            state = (self._row_texts(index), index == self.selected) if index < total else (self._blank, False)
+            if state == self._shown[i]:
+                continue
+            texts, selected = state
+            for label, text in zip(labels, texts):
+                label.configure(text=text, fg_color=("gray75", "gray30") if selected else "transparent")
+            self._shown[i] = state
+        if total > self.visible:
+            self.scrollbar.set(self.top / total, (self.top + self.visible) / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, index):
+        self.top = int(index)
+        self.render()
+
+    def yview_moveto(self, fraction):
+        self.scroll_to(float(fraction) * len(self.data))
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.yview_moveto(amount)
+        else:
+            step = self.visible if unit == "pages" else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel)
+        widget.bind("<Button-4>", self._on_wheel)
+        widget.bind("<Button-5>", self._on_wheel)
+
+    def _on_wheel(self, event):
+        up = getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0
+        self.scroll_to(self.top + (-3 if up else 3))
+        return "break"
+
+    def _on_click(self, row):
+        index = self.top + row
+        if index >= len(self.data):
+            return
+        self.selected = index
+        self.render()
+        if self.command is not None:
+            self.command()
+
+
+# Image cache
+#
+# Decoded images are shared between capygui.Image, configure image=, and
+# animations. Entries are keyed by path, mtime, file size and display size,
+# so an edited file is decoded again, and the least recently used entries
+# are dropped once the decoded pixels exceed `limit` bytes.
+IMAGE_SUFFIXES = (".png", ".gif", ".jpg", ".jpeg", ".bmp", ".webp")
+
+
+class ImageCache:
+    def __init__(self, limit=64 << 20):
+        self.limit = limit
+        self.used = 0  # bytes of decoded pixels held
+        self._entries = OrderedDict()  # key -> (image, nbytes)
+
+    @staticmethod
+    def _key(path, size, frame):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size, size, frame
+
+    @staticmethod
+    def decode(path, frame=0):
+        """Decoded pixels for one frame: a PIL image, or None without Pillow."""
+        try:
+            opener = PILImage.open
+        except ImportError:
+            return None
+        with opener(path) as image:
+            image.seek(frame)
+            return image.convert("RGBA")
+
+    def _wrap(self, path, size, frame, decoded):
+        if decoded is not None:
+            image = ctk.CTkImage(light_image=decoded, size=size or decoded.size)
+            return image, decoded.width * decoded.height * 4
+        options = {"format": f"gif -index {frame}"} if frame else {}
+        photo = tk.PhotoImage(file=path, **options)
+        return photo, photo.width() * photo.height() * 4
+
+    def get(self, path, size=None, frame=0, decoded=None):
+        key = self._key(path, size, frame)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry[0]
+        if decoded is None:
+            decoded = self.decode(path, frame)
+        image, nbytes = self._wrap(path, size, frame, decoded)
+        self._entries[key] = (image, nbytes)
+        self.used += nbytes
+        self._evict()
+        return image
+
+    def frames(self, path, size=None):
+        """Every frame of an animated image (GIF, APNG, WebP), each decoded once."""
+        frames = []
+        while True:
+            try:
+                frames.append(self.get(path, size, len(frames)))
+            except (EOFError, tk.TclError):
+                return frames
+
+    def preload(self, paths, size=None):
+        # Decoding runs on the task pool; wrapping into Tk images stays on this thread
+        paths = list(paths)
+        try:
+            PILImage.load()
+        except ImportError:
+            decoded = [None] * len(paths)
+        else:
+            decoded = list(_task_pool().map(ImageCache.decode, paths))
+        for path, pixels in zip(paths, decoded):
+            self.get(path, size, 0, pixels)
+
+    def _evict(self):
+        while self.used > self.limit and len(self._entries) > 1:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.used -= nbytes
 
-import time as t
+    def resize(self, limit):
+        self.limit = limit
+        self._evict()
 
-# Time
-class time:
-    @staticmethod
-    def sleep(arg: str):
-        seconds = float(resolve_variables(arg, Registers))
-        t.sleep(seconds)
+    def clear(self):
+        self._entries.clear()
+        self.used = 0
 
-    @staticmethod
-    def time(args):
-        dest = args.split(" ")[0]
-        Registers[dest] = int(t.time())
 
-    @staticmethod
-    def ctime(args):
-        args = args.split(" ")
-        dest = args[1]
-        target = resolve_variables("$" + args[0], Registers)
-        Registers[dest] = t.ctime(int(target))
+Images = ImageCache()
 
-    @staticmethod
-    def localtime(args):
-        dest = args.split(" ")[0]
-        Registers[dest] = t.localtime()
+
+def _image_files(source):
+    # A directory (sorted), a comma-separated list, or a single file
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(IMAGE_SUFFIXES)
+        )
+    return [path for path in source.split(",") if path]
+
+
+def _image_size(value):
+    # "64x48" -> (64, 48); anything else means the image's own size
+    if isinstance(value, str) and "x" in value:
+        width, height = value.lower().split("x", 1)
+        return int(width), int(height)
+    return None
 
 
 # capygui (native)
@@ -200,11 +1975,94 @@ class time:
 #
 # Layout note: widget creation does NOT perform any layout. Use capygui.pack/grid/place explicitly.
 class capygui:
-    apps = {}
-    elements = {}
-    vars = {}  # named tkinter variables
+    apps = ContextProxy("apps")
+    elements = ContextProxy("elements")
+    vars = ContextProxy("vars")  # named tkinter variables
 
     # --- Helpers ---
+    @staticmethod
+    def _on_import():
+        # `base.import capygui` loads the toolkit up front
+        try:
+            tk.load()
+            ctk.load()
+        except ImportError as e:
+            raise Exception(f"capygui requires customtkinter and tkinter: {e}")
+
+    @staticmethod
+    def _scheduler():
+        context = _active.get()
+        if context.scheduler is None:
+            context.scheduler = GuiScheduler()
+        return context.scheduler
+
+    @staticmethod
+    def _update(el, kind, *payload):
+        # set/configure/insert/delete/select/deselect: applied now, or queued
+        # for the next frame (in order, with consecutive ones coalesced)
+        context = _active.get()
+        scheduler = context.scheduler or capygui._scheduler()
+        if scheduler.fps and context.apps:
+            scheduler.defer(el, kind, payload)
+        else:
+            getattr(capygui, "_apply_" + kind)(el, *payload)
+
+    @staticmethod
+    def _flush_updates():
+        # Commands that read widgets, or change them outside _update, first
+        # apply what the script queued before them
+        scheduler = _active.get().scheduler
+        if scheduler is not None and scheduler.pending:
+            scheduler.flush()
+
+    @staticmethod
+    def _layout(el, method, kw, fallback=None):
+        # fallback: the options to retry with if the full set is rejected
+        batch = _active.get().layout_batch
+        if batch is not None:
+            batch.append((el, method, kw, fallback))
+            return
+        try:
+            getattr(el, method)(**kw)
+        except Exception:
+            if fallback is None:
+                raise
+            getattr(el, method)(**fallback)
+
+    @staticmethod
+    def _apply_batch():
+        context = _active.get()
+        batch, context.layout_batch = context.layout_batch, None
+        if not batch:
+            return
+        # Containers keep their size while they fill up, then settle once
+        masters = {}
+        for el, method, kw, _ in batch:
+            master = kw.get("in_") or getattr(el, "master", None)
+            if master is not None:
+                masters[id(master)] = master
+        for master in masters.values():
+            try:
+                master.pack_propagate(False)
+                master.grid_propagate(False)
+            except Exception:
+                pass
+        try:
+            for el, method, kw, fallback in batch:
+                capygui._layout(el, method, kw, fallback)
+        finally:
+            for master in masters.values():
+                try:
+                    master.pack_propagate(True)
+                    master.grid_propagate(True)
+                except Exception:
+                    pass
+            for app in list(capygui.apps.values()):
+                try:
+                    app.update_idletasks()
+                except Exception:
+                    pass
+
     @staticmethod
     def _get_parent(name):
         return capygui.apps.get(name) or capygui.elements.get(name)
@@ -349,11 +2207,62 @@ class capygui:
                 pass
         capygui.apps[name] = app
 
+    # --- Batched construction ---
+    # Between begin_batch and end_batch, pack/grid/place are queued and run
+    # together at the end with geometry propagation suspended, so Tk computes
+    # the layout once instead of after every widget.
+    @staticmethod
+    def begin_batch(arg=""):
+        context = _active.get()
+        if context.layout_batch is None:
+            context.layout_batch = []
+
+    @staticmethod
+    def end_batch(arg=""):
+        capygui._apply_batch()
+
+    @staticmethod
+    def host(args):
+        # host <window>          run the GUI until the window is closed
+        # host <window> nowait   show it and carry on; time.sleep keeps it responsive
+        parts = args.split()
+        if not parts or parts[0] not in capygui.apps:
+            return
+        Console.flush()
+        capygui._apply_batch()  # a batch left open is laid out before showing
+        scheduler = capygui._scheduler()
+        if "nowait" in parts[1:]:
+            scheduler.pump()
+        else:
+            scheduler.host(parts[0])
+
+    @staticmethod
+    def after(args):
+        # after <ms> <command>
+        parts = args.split(" ", 1)
+        ms = float(resolve_variables(parts[0], Registers))
+        capygui._scheduler().after(ms, Callback(parts[1] if len(parts) > 1 else ""))
+
+    @staticmethod
+    def every(args):
+        # every <timer> <ms> <command>   repeat until capygui.cancel <timer>
+        parts = args.split(" ", 2)
+        ms = float(resolve_variables(parts[1], Registers))
+        callback = Callback(parts[2] if len(parts) > 2 else "")
+        capygui._scheduler().after(ms, callback, name=parts[0], repeat=True)
+
     @staticmethod
-    def host(name):
-        parent = capygui.apps.get(name)
-        if parent:
-            parent.mainloop()
+    def fps(args):
+        # fps <frames per second>   0 applies every widget update immediately
+        scheduler = capygui._scheduler()
+        scheduler.flush()
+        scheduler.fps = max(float(resolve_variables(args.strip(), Registers)), 0.0)
+
+    @staticmethod
+    def cancel(args):
+        scheduler = _active.get().scheduler
+        if scheduler is not None:
+            scheduler.cancel(args.strip())
 
     # --- Elements creation (do NOT layout here) ---
     @staticmethod
@@ -422,31 +2331,21 @@ class capygui:
     def Button(args):
         tokens = args.split(" ")
         pos, kw = capygui._parse_kwargs(tokens)
+        # The command is compiled from the text as written, so its $registers
+        # are read when the button is clicked rather than now
+        raw = [token for token in tokens if "=" not in token]
         if len(pos) >= 3:
             parent_name, name, text = pos[0], pos[1], pos[2]
-            command = " ".join(pos[3:]) if len(pos) > 3 else None
+            command = " ".join(raw[3:])
             kw.setdefault("text", text)
         else:
             parent_name = kw.pop("parent", None)
             name = kw.pop("name", None)
-            command = kw.pop("command", None)
+            kw.pop("command", None)
+            command = next((token[8:] for token in tokens if token.startswith("command=")), "")
         parent = capygui._get_parent(parent_name)
-        def _make_command(cmd):
-            if not cmd:
-                return None
-            def _inner():
-                cmd = resolve_variables(cmd, Registers)
-                parts = cmd.split(" ", 1)
-                c = parts[0]
-                a = parts[1] if len(parts) > 1 else ""
-                if c in CommandMap:
-                    try:
-                        CommandMap[c](a)
-                    except Exception:
-                        pass
-            return _inner
-        if isinstance(command, str):
-            kw["command"] = _make_command(command)
+        if command:
+            kw["command"] = Callback(command)
         btn = ctk.CTkButton(parent, **kw) if kw else ctk.CTkButton(parent)
         # do NOT layout here
         capygui.elements[name] = btn
@@ -625,6 +2524,63 @@ class capygui:
         # DO NOT place/layout here even if geometry was provided
         capygui.elements[name] = sf
 
+    @staticmethod
+    def Canvas(args):
+        # Canvas <parent> <name> [width=] [height=] [bg=]  (drawn on by modules, e.g. physics.draw)
+        pos, kw = capygui._parse_kwargs(args.split())
+        parent_name, name = pos[0], pos[1]
+        kw.setdefault("highlightthickness", 0)
+        capygui.elements[name] = ctk.CTkCanvas(capygui._get_parent(parent_name), **kw)
+
+    @staticmethod
+    def List(args):
+        # List <parent> <name> [rows=20] [source=$REG] [row_height=24] [command run on select]
+        capygui._virtual_list(args, table=False)
+
+    @staticmethod
+    def Table(args):
+        # Table <parent> <name> <col1,col2,...> [sep=,] [rows=20] [source=$REG] [command run on select]
+        capygui._virtual_list(args, table=True)
+
+    @staticmethod
+    def _virtual_list(args, table):
+        # source/command/sep are taken as written: the source is read from its
+        # register as an object, the command is compiled, and "," stays text.
+        # Words after the fixed positional ones are the select command.
+        raw, tokens = {}, args.split(" ")
+        for token in tokens:
+            key = token.split("=", 1)[0]
+            if key in ("source", "command", "sep") and "=" in token:
+                raw[key] = token[len(key) + 1:]
+        pos, kw = capygui._parse_kwargs([token for token in tokens if token.split("=", 1)[0] not in raw])
+        parent_name, name = pos[0], pos[1]
+        columns = None
+        fixed = 2
+        if table:
+            columns = kw.pop("columns", None)
+            if columns is None:
+                # positional columns are the third word, before the command
+                columns = pos[2] if len(pos) > 2 else ""
+                fixed = 3
+            columns = columns.split(",") if isinstance(columns, str) else [str(c) for c in columns]
+        if "sep" in raw:
+            kw["sep"] = raw["sep"]
+        command = " ".join([token for token in tokens if "=" not in token][fixed:]) or raw.get("command")
+        if command:
+            kw["command"] = Callback(command)
+        widget = VirtualList(capygui._get_parent(parent_name), columns=columns, **kw)
+        if "source" in raw:
+            widget.set(capygui._source_value(raw["source"]))
+        capygui.elements[name] = widget
+
+    @staticmethod
+    def _source_value(text):
+        # `$REG` alone passes the register's value itself (a list, Vector...), not its text
+        match = _VAR_PATTERN.fullmatch(text)
+        if match:
+            return Registers.get(match.group(1) or match.group(2), "")
+        return resolve_variables(text, Registers)
+
     @staticmethod
     def Image(args):
         tokens = args.split(" ")
@@ -636,9 +2592,10 @@ class capygui:
             name = kw.pop("name", None)
             path = kw.pop("path", None)
         parent = capygui._get_parent(parent_name)
+        size = _image_size(kw.pop("size", None))
         try:
-            image = ctk.CTkImage(file=path)
-            label = ctk.CTkLabel(parent, image=image)
+            image = Images.get(path, size)
+            label = ctk.CTkLabel(parent, image=image, text="")
             label._ctk_image = image
             # do NOT pack/place here
             capygui.elements[name] = label
@@ -647,6 +2604,53 @@ class capygui:
             label = ctk.CTkLabel(parent, text="")
             capygui.elements[name] = label
 
+    @staticmethod
+    def preload_images(args):
+        # preload_images <dir|file,file,...> [size=WxH]
+        pos, kw = capygui._parse_kwargs(args.split(" "))
+        Images.preload(_image_files(" ".join(pos)), _image_size(kw.get("size")))
+
+    @staticmethod
+    def image_cache(args):
+        # image_cache <bytes>   limit for decoded images (default 64 MiB)
+        Images.resize(int(float(resolve_variables(args.strip(), Registers))))
+
+    @staticmethod
+    def animate(args):
+        # animate <element> <ms> <dir|file,file,...|animated file> [size=WxH] [loop=false]
+        # animate <element> stop
+        pos, kw = capygui._parse_kwargs(args.split(" "))
+        el = capygui.elements.get(pos[0])
+        if not el:
+            return
+        capygui._flush_updates()  # a queued configure image= must not land on top of the frames
+        previous = getattr(el, "_capy_animation", None)
+        if previous is not None:
+            el.after_cancel(previous)
+            el._capy_animation = None
+        if len(pos) < 3:
+            return  # stop
+        delay = int(float(pos[1]))
+        size = _image_size(kw.get("size"))
+        files = _image_files(" ".join(pos[2:]))
+        frames = Images.frames(files[0], size) if len(files) == 1 else [Images.get(path, size) for path in files]
+        if not frames:
+            return
+        loop = kw.get("loop", True)
+
+        def show(index):
+            el.configure(image=frames[index])
+            el._ctk_image = frames[index]
+            index += 1
+            if index == len(frames):
+                if not loop:
+                    el._capy_animation = None
+                    return
+                index = 0
+            el._capy_animation = el.after(delay, show, index)
+
+        show(0)
+
     # --- Generic widget functions (pack/grid/place/configure/destroy) ---
     @staticmethod
     def pack(args):
@@ -661,16 +2665,15 @@ class capygui:
                 in_parent = capygui._get_parent(in_name)
                 if in_parent:
                     kw["in_"] = in_parent
-            el.pack(**kw)
+            capygui._layout(el, "pack", kw)
 
     @staticmethod
-    def grid(args):
-        parts = args.split(" ")
-        element_name, row, column = parts[0], int(parts[1]), int(parts[2])
-        options = {}
-        if len(parts) > 3:
-            _, kw = capygui._parse_kwargs(parts[3:])
-            options = kw
+    @command
+    def grid(element_name: str, row: int, column: int, *options: str):
+        if options:
+            _, options = capygui._parse_kwargs(options)
+        else:
+            options = {}
         el = capygui.elements.get(element_name)
         if el:
             # support "in" or "in_" to refer to parent by name
@@ -679,19 +2682,15 @@ class capygui:
                 in_parent = capygui._get_parent(in_name)
                 if in_parent:
                     options["in_"] = in_parent
-            try:
-                el.grid(row=row, column=column, **options)
-            except Exception:
-                el.grid(row=row, column=column)
+            capygui._layout(el, "grid", dict(options, row=row, column=column), {"row": row, "column": column})
 
     @staticmethod
-    def place(args):
-        parts = args.split(" ")
-        element_name, x, y = parts[0], int(parts[1]), int(parts[2])
-        options = {}
-        if len(parts) > 3:
-            _, kw = capygui._parse_kwargs(parts[3:])
-            options = kw
+    @command
+    def place(element_name: str, x: int, y: int, *options: str):
+        if options:
+            _, options = capygui._parse_kwargs(options)
+        else:
+            options = {}
         el = capygui.elements.get(element_name)
         if el:
             in_name = options.pop("in", options.pop("in_", None))
@@ -699,10 +2698,7 @@ class capygui:
                 in_parent = capygui._get_parent(in_name)
                 if in_parent:
                     options["in_"] = in_parent
-            try:
-                el.place(x=x, y=y, **options)
-            except Exception:
-                el.place(x=x, y=y)
+            capygui._layout(el, "place", dict(options, x=x, y=y), {"x": x, "y": y})
 
     @staticmethod
     def configure(args):
@@ -718,27 +2714,30 @@ class capygui:
             if k in ("variable", "textvariable") and isinstance(v, str):
                 # treat as named tk variable
                 kw[k] = capygui._ensure_variable(v, var_type="int" if k == "variable" else "string")
+        capygui._update(el, "configure", kw)
+
+    @staticmethod
+    def _apply_configure(el, kw):
+        if isinstance(kw.get("image"), str):
+            # image=path, optionally image_size=WxH
+            try:
+                kw["image"] = Images.get(kw["image"], _image_size(kw.pop("image_size", None)))
+                el._ctk_image = kw["image"]
+            except Exception:
+                del kw["image"]
         try:
             el.configure(**kw)
-            # special-case image update if string path provided
-            if "image" in kw and isinstance(kw["image"], str):
-                try:
-                    el.configure(image=ctk.CTkImage(file=kw["image"]))
-                except Exception:
-                    pass
         except Exception:
-            # last-resort: try ctk image
-            if "image" in kw and isinstance(kw["image"], str):
-                try:
-                    el.configure(image=ctk.CTkImage(file=kw["image"]))
-                except Exception:
-                    pass
+            pass
 
     @staticmethod
     def destroy(args):
         name = args.strip()
         el = capygui.elements.get(name)
         if el:
+            scheduler = _active.get().scheduler
+            if scheduler is not None:
+                scheduler.pending.pop(id(el), None)
             try:
                 el.destroy()
             except Exception:
@@ -754,6 +2753,7 @@ class capygui:
         dest = parts[1] if len(parts) > 1 else ""
         el = capygui.elements.get(name)
         val = ""
+        capygui._flush_updates()  # read what the script last wrote
         if not el:
             Registers[dest] = ""
             return
@@ -788,10 +2788,17 @@ class capygui:
         # set <element> <value>
         parts = args.split(" ", 1)
         name = parts[0]
-        value = resolve_variables(parts[1], Registers) if len(parts) > 1 else ""
         el = capygui.elements.get(name)
+        if isinstance(el, VirtualList):
+            el.set(capygui._source_value(parts[1]) if len(parts) > 1 else [])
+            return
+        value = resolve_variables(parts[1], Registers) if len(parts) > 1 else ""
         if not el:
             return
+        capygui._update(el, "set", value)
+
+    @staticmethod
+    def _apply_set(el, value):
         try:
             # preferred API
             if hasattr(el, "set"):
@@ -830,10 +2837,17 @@ class capygui:
         parts = args.split(" ", 2)
         name = parts[0]
         index = parts[1]
-        text = resolve_variables(parts[2], Registers) if len(parts) > 2 else ""
         el = capygui.elements.get(name)
+        if isinstance(el, VirtualList):
+            el.insert(resolve_variables(index, Registers), capygui._source_value(parts[2]) if len(parts) > 2 else "")
+            return
+        text = resolve_variables(parts[2], Registers) if len(parts) > 2 else ""
         if not el:
             return
+        capygui._update(el, "insert", index, text)
+
+    @staticmethod
+    def _apply_insert(el, index, text):
         try:
             el.insert(index, text)
         except Exception:
@@ -856,6 +2870,13 @@ class capygui:
         el = capygui.elements.get(name)
         if not el:
             return
+        if isinstance(el, VirtualList):
+            el.delete(start, end)  # like its set/insert, applied at once
+            return
+        capygui._update(el, "delete", start, end)
+
+    @staticmethod
+    def _apply_delete(el, start, end):
         try:
             el.delete(start, end)
         except Exception:
@@ -866,10 +2887,12 @@ class capygui:
 
     @staticmethod
     def select(args):
-        name = args.strip()
-        el = capygui.elements.get(name)
-        if not el:
-            return
+        el = capygui.elements.get(args.strip())
+        if el:
+            capygui._update(el, "select")
+
+    @staticmethod
+    def _apply_select(el):
         try:
             if hasattr(el, "select"):
                 el.select()
@@ -885,10 +2908,12 @@ class capygui:
 
     @staticmethod
     def deselect(args):
-        name = args.strip()
-        el = capygui.elements.get(name)
-        if not el:
-            return
+        el = capygui.elements.get(args.strip())
+        if el:
+            capygui._update(el, "deselect")
+
+    @staticmethod
+    def _apply_deselect(el):
         try:
             if hasattr(el, "deselect"):
                 el.deselect()
@@ -911,6 +2936,10 @@ class capygui:
         el = capygui.elements.get(name)
         if not el:
             return
+        capygui._flush_updates()  # scroll over the content the script just inserted
+        if isinstance(el, VirtualList):
+            el.scroll_to(y)  # a row index rather than a fraction
+            return
         try:
             # CTkScrollableFrame delegates to underlying canvas
             el.yview_moveto(y)
@@ -928,6 +2957,7 @@ class capygui:
         parts = args.split(" ", 1)
         parent_name = parts[0]
         child_token = parts[1] if len(parts) > 1 else ""
+        capygui._flush_updates()  # involves two widgets, so it can't be queued on one
         parent = capygui.elements.get(parent_name) or capygui.apps.get(parent_name)
         # segmented add: if parent exists and is segmented button
         if isinstance(parent, ctk.CTkSegmentedButton):
@@ -981,16 +3011,7 @@ class capygui:
         el = capygui.elements.get(name)
         if not el:
             return
-        def handler(event_obj=None):
-            command_str = resolve_variables(cmd, Registers)
-            parts = command_str.split(" ", 1)
-            c = parts[0]
-            a = parts[1] if len(parts) > 1 else ""
-            if c in CommandMap:
-                try:
-                    CommandMap[c](a)
-                except Exception:
-                    pass
+        handler = Callback(cmd)
         try:
             el.bind(event, handler)
         except Exception:
@@ -1033,6 +3054,11 @@ class capygui:
     def update(args):
         # update <element>  (or "update all")
         name = args.strip()
+        scheduler = _active.get().scheduler
+        if scheduler is not None and scheduler.fps:
+            if not scheduler.frame_due():
+                return  # drawn with the next frame
+            scheduler.flush()
         if name == "all":
             # update all app windows
             for a in capygui.apps.values():
@@ -1049,33 +3075,832 @@ class capygui:
                 pass
 
 
-class CapyCompiler:
+class Context:
+    """
+    The state of one interpreter: registers, command table, GUI objects,
+    console buffer and open files. Code runs against whichever context is
+    active in its thread; threads that never activate one share a default.
+    """
+
+    def __init__(self, commands=None):
+        self.registers = RegisterFile()
+        self.commands = dict(_BASE_COMMANDS if commands is None else commands)
+        self.apps = {}
+        self.elements = {}
+        self.vars = {}
+        self.console = ConsoleOutput()
+        self.files = weakref.WeakSet()
+        self.tasks = []  # futures from base.spawn not yet joined
+        self.scheduler = None  # GuiScheduler, created once capygui needs one
+        self.layout_batch = None  # queued pack/grid/place calls inside capygui.begin_batch
+        self.profiler = None  # Profiler; instruments what is compiled while it is set
+
+    @contextmanager
+    def activate(self):
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    def run(self, func, *args, **kwargs):
+        with self.activate():
+            return func(*args, **kwargs)
+
+    def join_tasks(self, raise_errors=True):
+        """Wait for every spawned task; re-raises the first error unless told not to."""
+        tasks, self.tasks = self.tasks, []
+        error = None
+        for task in tasks:
+            try:
+                task.result()
+            except Exception as e:
+                error = error or e
+        if error is not None and raise_errors:
+            raise error
+
+    def reset(self):
+        """Forget registers, imported commands, GUI objects and open files."""
+        self.join_tasks(raise_errors=False)
+        self.console.flush()
+        close_files(self)
+        self.registers.clear()
+        self.commands.clear()
+        self.commands.update(_BASE_COMMANDS)
+        if self.scheduler is not None:
+            self.scheduler.close()
+            self.scheduler = None
+        self.layout_batch = None
+        self.apps.clear()
+        self.elements.clear()
+        self.vars.clear()
+
+    def fork(self):
+        """A new context starting with this one's registers and imported commands."""
+        other = Context(self.commands)
+        other.registers = self.registers.copy()
+        return other
+
+
+_active = ContextVar("capy_context", default=Context())
+
+
+def current_context() -> Context:
+    return _active.get()
+
+
+def _in_context(method):
+    # Runs a CapyCompiler method with the compiler's context active
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        token = _active.set(self.context)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _active.reset(token)
+    return wrapper
+
+
+# Compiled instructions
+class Instruction:
+    """One pre-resolved line: the bound handler and its pre-split operands."""
+
+    __slots__ = ("command", "handler", "argument", "operands", "refs", "line", "args", "branches")
+
+    def __init__(self, command, handler, argument, line=0, operands=None, refs=None):
+        self.command = command
+        self.handler = handler
+        self.argument = argument
+        if operands is None:
+            operands, refs = split_operands(argument)
+        self.operands, self.refs = operands, refs
+        if type(handler) is LazyCommand and handler.decoded:
+            # Operand decoding needs the real handler, so this use binds it now
+            handler = self.handler = handler.bind()
+        self.line = line
+        self.branches = getattr(handler, "branches", False)
+        # Arguments passed on every execution, fixed at compile time
+        decode = getattr(handler, "decode_operands", None)
+        if decode is not None:
+            self.args = decode(self.operands, self.refs)
+        else:
+            self.args = (argument,)
+
+    def execute(self):
+        return self.handler(*self.args)
+
+
+class LoopCounter:
+    """Iteration state of one linked base.repeat, shared with its base.end."""
+
+    __slots__ = ("i", "n")
+
     def __init__(self):
-        pass
+        self.i = self.n = 0
 
-    def compile(self, source_file):
+
+# Profiling
+#
+# `capy --profile` gives the context a Profiler; every instruction compiled
+# while it is set becomes a ProfiledInstruction that times its handler.
+# Handlers, linking and identity checks see the same instruction either way,
+# and runs without a profiler never execute any of this.
+class ProfileSite:
+    """Totals for one source line: wall/CPU time including nested commands, and own time."""
+
+    __slots__ = ("source", "line", "command", "calls", "wall", "cpu", "own")
+
+    def __init__(self, source, line, command):
+        self.source, self.line, self.command = source, line, command
+        self.calls = 0
+        self.wall = self.cpu = self.own = 0.0
+
+    @property
+    def name(self):
+        # flamegraph frames are separated by ';'
+        return f"{self.source}:{self.line} {self.command}".replace(";", ",")
+
+
+class Profiler:
+    def __init__(self):
+        self.sites = {}
+        self.stacks = {}  # tuple of sites -> own wall time spent there
+        self.stack = []  # [site, wall time of nested commands] per running instruction
+        self.started = t.perf_counter()
+        self.started_cpu = t.process_time()
+        self.wall = self.cpu = None
+
+    def instrument(self, ins, source):
+        key = (source, ins.line, ins.command)
+        site = self.sites.get(key)
+        if site is None:
+            site = self.sites[key] = ProfileSite(*key)
+        return ProfiledInstruction(ins, site, self)
+
+    def record(self, frame, wall, cpu):
+        site = frame[0]
+        own = wall - frame[1]
+        site.calls += 1
+        site.wall += wall
+        site.cpu += cpu
+        site.own += own
+        stack = self.stack
+        if stack:
+            stack[-1][1] += wall
+        key = tuple(f[0] for f in stack) + (site,)
+        self.stacks[key] = self.stacks.get(key, 0.0) + own
+
+    def stop(self):
+        if self.wall is None:
+            self.wall = t.perf_counter() - self.started
+            self.cpu = t.process_time() - self.started_cpu
+
+    def commands(self):
+        # Per-handler totals; own time, so nested commands are not counted twice
+        totals = {}
+        for site in self.sites.values():
+            calls, own, cpu = totals.get(site.command, (0, 0.0, 0.0))
+            totals[site.command] = (calls + site.calls, own + site.own, cpu + site.cpu)
+        return sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+
+    def report(self, out=None, limit=20):
+        """Print the costliest lines and commands, by own wall time."""
+        self.stop()
+        out = out or sys.stderr
+        sites = sorted((s for s in self.sites.values() if s.calls), key=lambda s: s.own, reverse=True)
+        calls = sum(s.calls for s in sites)
+        out.write(f"\nprofile: {self.wall:.3f}s wall, {self.cpu:.3f}s cpu, {calls:,} commands run\n\n")
+        out.write(f"{'calls':>10} {'own ms':>10} {'total ms':>10} {'cpu ms':>10} {'per call':>9}  line\n")
+        for s in sites[:limit]:
+            out.write(
+                f"{s.calls:>10,} {s.own * 1e3:>10.3f} {s.wall * 1e3:>10.3f} {s.cpu * 1e3:>10.3f} "
+                f"{_per_call(s.own, s.calls):>9}  {s.source}:{s.line} {s.command}\n"
+            )
+        if len(sites) > limit:
+            out.write(f"{'':>10} ... {len(sites) - limit} more lines\n")
+        out.write(f"\n{'calls':>10} {'own ms':>10} {'cpu ms':>10} {'per call':>9}  command\n")
+        for command, (count, own, cpu) in self.commands()[:limit]:
+            out.write(f"{count:>10,} {own * 1e3:>10.3f} {cpu * 1e3:>10.3f} {_per_call(own, count):>9}  {command}\n")
+        out.flush()
+
+    def to_json(self):
+        self.stop()
+        return {
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "lines": [
+                {"source": s.source, "line": s.line, "command": s.command, "calls": s.calls,
+                 "wall": s.wall, "own": s.own, "cpu": s.cpu}
+                for s in sorted(self.sites.values(), key=lambda s: s.own, reverse=True) if s.calls
+            ],
+            "commands": [
+                {"command": command, "calls": count, "own": own, "cpu": cpu}
+                for command, (count, own, cpu) in self.commands()
+            ],
+        }
+
+    def collapsed(self):
+        # One "frame;frame;frame microseconds" line per call stack (flamegraph.pl, speedscope)
+        return [
+            f"{';'.join(site.name for site in stack)} {round(own * 1e6)}"
+            for stack, own in self.stacks.items() if round(own * 1e6) > 0
+        ]
+
+    def write(self, path, fmt):
+        with open(path, "w") as out:
+            if fmt == "json":
+                json.dump(self.to_json(), out, indent=2)
+            else:
+                out.write("\n".join(self.collapsed()) + "\n")
+
+
+def _per_call(seconds, calls):
+    us = seconds / calls * 1e6 if calls else 0.0
+    return f"{us:.1f}us" if us < 1000 else f"{us / 1000:.2f}ms"
+
+
+class ProfiledInstruction(Instruction):
+    __slots__ = ("site", "profiler")
+
+    def __init__(self, ins, site, profiler):
+        for name in Instruction.__slots__:
+            setattr(self, name, getattr(ins, name))
+        self.site = site
+        self.profiler = profiler
+
+    def execute(self):
+        profiler = self.profiler
+        frame = [self.site, 0.0]
+        profiler.stack.append(frame)
+        wall, cpu = t.perf_counter(), t.thread_time()
+        try:
+            return self.handler(*self.args)
+        finally:
+            wall, cpu = t.perf_counter() - wall, t.thread_time() - cpu
+            profiler.stack.pop()
+            profiler.record(frame, wall, cpu)
+
+
+
+
+class CapyCompiler:
+    def __init__(self, context=None):
+        self.context = context if context is not None else current_context()
+        self.imports = []
+        self.source = "<script>"  # names this compiler's lines in profiles
+
+    def reset(self):
+        self.context.reset()
+        self.imports = []
+
+    def fork(self):
+        forked = CapyCompiler(self.context.fork())
+        forked.imports = list(self.imports)
+        return forked
+
+    @_in_context
+    def compile_line(self, line, number=0):
+        # Returns None for blank lines, comments and imports
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return None
+
+        parts = line.split(" ", 1)
+        command = parts[0]
+        argument = parts[1] if len(parts) > 1 else ""
+
+        handler = CommandMap.get(command)
+        if handler is None:
+            raise Exception("Unknown command: " + command)
+
+        # Imports register new commands, so they run as soon as they are seen
+        # and leave nothing to do at run time (a cached program replays
+        # self.imports before its instructions are rebuilt)
+        if handler is base.importmod:
+            handler(argument)
+            self.imports.append(argument)
+            return None
+
+        return self._instruction(command, handler, argument, number)
+
+    def _instruction(self, *args):
+        ins = Instruction(*args)
+        profiler = self.context.profiler
+        return ins if profiler is None else profiler.instrument(ins, self.source)
+
+    @_in_context
+    def compile_lines(self, lines):
+        program = []
+        self.imports = []
+        for number, line in enumerate(lines, 1):
+            instruction = self.compile_line(line, number)
+            if instruction is not None:
+                program.append(instruction)
+        return self.link(program)
+
+    @_in_context
+    def compile_file(self, source_file, use_cache=True, refresh=False):
+        # refresh=True ignores any existing cache entry and rewrites it
         if source_file.split(".")[-1] != "capy":
             raise Exception("Invalid file type: " + "." + source_file.split(".")[-1])
+        self.source = source_file
+
+        if use_cache and not refresh:
+            program = self.load_cache(source_file)
+            if program is not None:
+                return program
 
         content = Path(source_file).read_text()
-        for line in content.splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
+        program = self.compile_lines(content.splitlines())
+        if use_cache:
+            self.write_cache(source_file, program, content)
+        return program
+
+    # --- Compiled-script cache ---
+    @staticmethod
+    def cache_path(source_file):
+        source = Path(source_file)
+        return source.parent / CACHE_DIR / f"{source.stem}.capy-{ver}.capyc"
+
+    @staticmethod
+    def _digest(content):
+        return hashlib.sha1(content.encode("utf-8", "surrogatepass")).digest()
+
+    @staticmethod
+    def _module_stamp(name):
+        # Built-in command classes are covered by `ver`; modules/ files by mtime
+        path = None if name in globals() else ModuleRegistry.path(name)
+        if not path:
+            return 0
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def write_cache(self, source_file, program, content):
+        try:
+            stat = os.stat(source_file)
+            code = tuple(
+                (ins.command, ins.argument, ins.line, ins.operands, ins.refs)
+                for ins in program
+            )
+            imports = tuple((name, self._module_stamp(name)) for name in self.imports)
+            data = marshal.dumps((
+                CACHE_FORMAT, ver, stat.st_mtime_ns, stat.st_size,
+                self._digest(content), imports, code,
+            ))
+            path = self.cache_path(source_file)
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except (OSError, ValueError):
+            # Caching is best-effort; an unwritable directory just means no cache
+            pass
+
+    def load_cache(self, source_file):
+        try:
+            data = self.cache_path(source_file).read_bytes()
+            stat = os.stat(source_file)
+            fmt, cached_ver, mtime, size, digest, imports, code = marshal.loads(data)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        if fmt != CACHE_FORMAT or cached_ver != ver:
+            return None
+        content = None
+        if (mtime, size) != (stat.st_mtime_ns, stat.st_size):
+            # Touched but possibly unchanged (checkout, copy): fall back to the hash
+            content = Path(source_file).read_text()
+            if self._digest(content) != digest:
+                return None
+
+        for name, stamp in imports:
+            try:
+                CommandMap["base.import"](name)
+            except Exception:
+                return None
+            if self._module_stamp(name) != stamp:
+                return None
+        self.imports = [name for name, _ in imports]
+
+        program = []
+        for command, argument, line, ops, refs in code:
+            handler = CommandMap.get(command)
+            if handler is None:
+                # The imported modules no longer provide this command
+                return None
+            program.append(self._instruction(command, handler, argument, line, ops, refs))
+        if content is not None:
+            # Same source under a new mtime: restamp so the next run skips the hash
+            self.write_cache(source_file, program, content)
+        return self.link(program)
+
+    # --- Control flow linking ---
+    @staticmethod
+    def _condition(ins):
+        if len(ins.operands) < 3 or ins.operands[1] not in _COMPARISONS:
+            raise Exception(f"line {ins.line}: expected '<a> <op> <b>' with op one of {' '.join(_COMPARISONS)}")
+        left = _source_operand(ins.operands[0], ins.refs[0])
+        right = _source_operand(ins.operands[2], ins.refs[2])
+        return left, _COMPARISONS[ins.operands[1]], right
+
+    def link(self, program):
+        """Resolve labels and loop blocks to instruction indexes."""
+        labels = {}
+        for index, ins in enumerate(program):
+            if ins.handler is base.label:
+                name = ins.argument.strip()
+                if name in labels:
+                    raise Exception(f"line {ins.line}: duplicate label '{name}'")
+                labels[name] = index + 1
+
+        def target(ins, name):
+            if name not in labels:
+                raise Exception(f"line {ins.line}: unknown label '{name}'")
+            return labels[name]
+
+        loops = []  # indexes of open repeat/while instructions
+        for index, ins in enumerate(program):
+            handler = ins.handler
+            if handler is base.goto:
+                ins.args = (target(ins, ins.argument.strip()),)
+            elif handler is base.if_:
+                if len(ins.operands) != 4:
+                    raise Exception(f"line {ins.line}: usage: base.if <a> <op> <b> <label>")
+                ins.args = self._condition(ins) + (target(ins, ins.operands[3]),)
+            elif handler is base.repeat or handler is base.while_:
+                loops.append(index)
+            elif handler is base.break_ or handler is base.continue_:
+                if not loops:
+                    raise Exception(f"line {ins.line}: {ins.command} outside of a loop")
+                # patched once the matching base.end is seen
+                ins.args = (loops[-1],)
+            elif handler is base.end:
+                if not loops:
+                    raise Exception(f"line {ins.line}: base.end without base.repeat or base.while")
+                start = loops.pop()
+                opener = program[start]
+                if opener.handler is base.repeat:
+                    count = opener.operands[0] if opener.operands else ""
+                    state = LoopCounter()
+                    reg = register_slot(opener.operands[1]) if len(opener.operands) > 1 else None
+                    opener.args = (_source_operand(count, "$" in count), state, reg, index + 1)
+                    ins.args = (start + 1, state, reg)
+                else:
+                    opener.args = self._condition(opener) + (index + 1,)
+                    ins.args = (start + 1,)
+                for inner in program[start + 1:index]:
+                    if inner.args == (start,):
+                        if inner.handler is base.break_:
+                            inner.args = (index + 1,)
+                        elif inner.handler is base.continue_:
+                            inner.args = (index,)
+        if loops:
+            opener = program[loops[-1]]
+            raise Exception(f"line {opener.line}: {opener.command} without base.end")
+        return program
+
+    @_in_context
+    def execute(self, program):
+        try:
+            with console_stdout():
+                self._run(program)
+                self.context.join_tasks()
+        finally:
+            self.context.join_tasks(raise_errors=False)
+            Console.flush()
 
-            parts = line.split(" ", 1)
-            command = parts[0]
-            argument = parts[1] if len(parts) > 1 else ""
+    @staticmethod
+    def _run(program):
+        if not any(ins.branches for ins in program):
+            for instruction in program:
+                instruction.execute()
+            return
 
-            if command in CommandMap:
-                CommandMap[command](argument)
+        pc = 0
+        end = len(program)
+        while pc < end:
+            instruction = program[pc]
+            pc += 1
+            if instruction.branches:
+                target = instruction.execute()
+                if target is not None:
+                    pc = target
             else:
-                raise Exception("Unknown command: " + command)
+                instruction.execute()
+
+    def compile(self, source_file):
+        self.execute(self.compile_file(source_file))
+
+    # --- Streaming execution ---
+    @_in_context
+    def stream(self, lines):
+        """
+        Compile and run `lines` one at a time, holding only the current loop
+        block in memory. Loops may use labels inside the block; at the top
+        level, base.goto/base.if can only jump forward, and the lines up to
+        the label are skipped without being run.
+        """
+        self.imports = []
+        block = []
+        depth = 0
+        skip_to = None
+        try:
+            with console_stdout():
+                for number, line in enumerate(lines, 1):
+                    ins = self.compile_line(line, number)
+                    if ins is None:
+                        continue
+                    handler = ins.handler
+
+                    if skip_to is not None:
+                        if handler is base.label and ins.argument.strip() == skip_to:
+                            skip_to = None
+                        continue
+
+                    if depth or handler is base.repeat or handler is base.while_:
+                        block.append(ins)
+                        if handler is base.repeat or handler is base.while_:
+                            depth += 1
+                        elif handler is base.end:
+                            depth -= 1
+                            if depth == 0:
+                                self._run(self.link(block))
+                                block = []
+                        continue
+
+                    if handler is base.goto:
+                        skip_to = ins.argument.strip()
+                    elif handler is base.if_:
+                        if len(ins.operands) != 4:
+                            raise Exception(f"line {ins.line}: usage: base.if <a> <op> <b> <label>")
+                        if base.if_(*self._condition(ins), True):
+                            skip_to = ins.operands[3]
+                    elif handler is base.label:
+                        pass
+                    elif ins.branches:
+                        raise Exception(f"line {ins.line}: {ins.command} outside of a loop")
+                    else:
+                        ins.execute()
+
+                if depth:
+                    raise Exception(f"line {block[0].line}: {block[0].command} without base.end")
+                if skip_to is not None:
+                    raise Exception(f"unknown label '{skip_to}' (only forward jumps work when streaming)")
+                self.context.join_tasks()
+        finally:
+            self.context.join_tasks(raise_errors=False)
+            Console.flush()
+
+    def stream_file(self, source_file):
+        self.source = "<stdin>" if source_file == "-" else source_file
+        if source_file == "-":
+            self.stream(sys.stdin)
+            return
+        with open(source_file) as source:
+            self.stream(source)
 
     def direct_compile(self, code_string):
-        for line in code_string.split(";"):
-            command, arguements = line.strip().split(" ", 1)[0], line.strip().split(" ", 1)[1]
-            CommandMap[command](arguements)
+        self.execute(self.compile_lines(code_string.split(";")))
+
+# Server mode
+#
+# `capy --serve` keeps one warm interpreter listening on a Unix socket.
+# Each connection sends one JSON request line ({"run": path} or
+# {"code": "..."}, plus "cwd") and receives JSON lines back: {"stdout": ...}
+# chunks as the script prints, then {"status", "error", "time", "registers"}.
+# Requests run one at a time, each in a fresh Context.
+def default_socket_path():
+    return os.environ.get("CAPY_SOCKET") or os.path.join(
+        tempfile.gettempdir(), f"capy-{getattr(os, 'getuid', lambda: 0)()}.sock"
+    )
+
+
+class _StreamWriter(iolib.TextIOBase):
+    """File-like stdout replacement that forwards writes as JSON lines."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            self.stream.write(json.dumps({"stdout": text}) + "\n")
+            self.stream.flush()
+        return len(text)
+
+
+def run_job(request, stdout):
+    """
+    Run one {"run": path} or {"code": ...} request in a fresh Context with
+    stdout redirected to `stdout`. Returns the result dict shared by the
+    server and batch modes.
+    """
+    compiler = CapyCompiler(Context())
+    status, error = 0, None
+    start = t.perf_counter()
+    saved = sys.stdout, sys.stdin, os.getcwd()
+    sys.stdout = stdout
+    sys.stdin = iolib.StringIO()  # no terminal to read from
+    try:
+        if request.get("cwd"):
+            os.chdir(request["cwd"])
+        if "run" in request:
+            compiler.compile(request["run"])
+        elif "code" in request:
+            compiler.direct_compile(request["code"])
+        else:
+            raise Exception("request must contain 'run' or 'code'")
+    except Exception as e:
+        status, error = 1, "".join(traceback.format_exception_only(type(e), e)).strip()
+    finally:
+        compiler.context.console.flush()
+        close_files(compiler.context)
+        sys.stdout, sys.stdin = saved[0], saved[1]
+        os.chdir(saved[2])
+
+    registers = compiler.context.registers
+    return {
+        "status": status,
+        "error": error,
+        "time": t.perf_counter() - start,
+        "registers": {k: str(v) for k, v in registers.items() if not k.startswith(".")},
+    }
+
+
+def _serve_request(conn):
+    stream = conn.makefile("rw", encoding="utf-8")
+    try:
+        request = json.loads(stream.readline() or "{}")
+    except ValueError:
+        request = {}
+
+    result = run_job(request, _StreamWriter(stream))
+    try:
+        stream.write(json.dumps(result) + "\n")
+        stream.flush()
+    except OSError:
+        pass  # client went away
+
+
+def _remove_stale_socket(socket_path):
+    """
+    Clear the way for a server at `socket_path`; returns an error message if
+    something that must not be removed is there (a file, or a live server).
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISSOCK(mode):
+        return f"{socket_path} exists and is not a socket"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)  # left behind by a server that is gone
+            return None
+    return f"a server is already running on {socket_path}"
+
+
+def serve(socket_path):
+    """Serve requests on `socket_path` until interrupted; returns an exit status."""
+    if not hasattr(socket, "AF_UNIX"):
+        print("error: --serve needs Unix domain sockets, which this platform lacks")
+        return 1
+
+    error = _remove_stale_socket(socket_path)
+    if error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    print(f"capyscript {ver} serving on {socket_path}")
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    _serve_request(conn)
+                except OSError:
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            if stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                os.unlink(socket_path)
+        except OSError:
+            pass
+    return 0
+
+
+def remote(request, socket_path):
+    """Send one request to a running server, echo its stdout, return its status."""
+    request["cwd"] = os.getcwd()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(socket_path)
+        except OSError as e:
+            print(f"error: cannot reach server at {socket_path}: {e}", file=sys.stderr)
+            return 1
+        stream = conn.makefile("rw", encoding="utf-8")
+        stream.write(json.dumps(request) + "\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if "stdout" in message:
+                sys.stdout.write(message["stdout"])
+                sys.stdout.flush()
+            elif "status" in message:
+                if message["error"]:
+                    print(message["error"], file=sys.stderr)
+                return message["status"]
+    print("error: server closed the connection", file=sys.stderr)
+    return 1
+
+
+# Batch mode
+#
+# `capy --batch` runs many scripts on a process pool. Workers are reused
+# across jobs, so Python modules imported by one script stay loaded for
+# the next; each job still runs in a fresh Context.
+def _batch_job(path):
+    out = iolib.StringIO()
+    result = run_job({"run": path}, out)
+    del result["registers"]
+    result["script"] = path
+    result["stdout"] = out.getvalue()
+    return result
+
+
+def batch_scripts(args):
+    # *.capy arguments are scripts; anything else is a manifest listing one
+    # script per line (relative to the manifest, # comments allowed)
+    scripts = []
+    for arg in args:
+        if arg.endswith(".capy"):
+            scripts.append(os.path.abspath(arg))
+            continue
+        root = os.path.dirname(os.path.abspath(arg))
+        for line in Path(arg).read_text().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                scripts.append(os.path.join(root, line))
+    return scripts
+
+
+def run_batch(scripts, jobs=None, as_json=False):
+    """Run `scripts` on a process pool and report each result; returns the failure count."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    failures = 0
+    results = []
+    start = t.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        for result in pool.map(_batch_job, scripts):
+            failures += result["status"] != 0
+            if as_json:
+                results.append(result)
+                continue
+            state = "ok" if result["status"] == 0 else "FAILED"
+            print(f"== {result['script']} [{state}, {result['time'] * 1000:.1f} ms]")
+            sys.stdout.write(result["stdout"])
+            if result["error"]:
+                print(result["error"])
+    elapsed = t.perf_counter() - start
+
+    if as_json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{len(scripts)} scripts, {failures} failed, {elapsed:.2f}s")
+    return failures
+
+
+def run_profiled(args, outputs):
+    """Run a file (or --drun code) with a Profiler, then report; outputs maps "json"/"collapsed" to paths."""
+    compiler = CapyCompiler()
+    profiler = compiler.context.profiler = Profiler()
+    try:
+        if args[0] == "--drun":
+            compiler.source = "<drun>"
+            compiler.direct_compile(" ".join(args[1:]))
+        elif args[0] == "-":
+            compiler.stream_file("-")
+        else:
+            compiler.compile(args[0])
+    finally:
+        compiler.context.profiler = None
+        profiler.report()
+        for fmt, path in outputs.items():
+            profiler.write(path, fmt)
+            print(f"profile written to {path}", file=sys.stderr)
+
 
 def main():
     args = sys.argv[1:]
@@ -1094,7 +3919,28 @@ def main():
             return
 
         filename = args[1]
-        CapyCompiler().compile(filename)
+        if filename == "-":
+            CapyCompiler().stream_file(filename)
+        else:
+            CapyCompiler().compile(filename)
+        return
+
+    if args[0] == "--stream":
+        if len(args) < 2:
+            print("error: --stream requires a file (or - for stdin)")
+            return
+
+        CapyCompiler().stream_file(args[1])
+        return
+
+    if args[0] == "--compile":
+        if len(args) < 2:
+            print("error: --compile requires a file")
+            return
+
+        for filename in args[1:]:
+            CapyCompiler().compile_file(filename, refresh=True)
+            print(f"compiled {filename} -> {CapyCompiler.cache_path(filename)}")
         return
 
     if args[0] == "--drun":
@@ -1105,6 +3951,54 @@ def main():
         CapyCompiler().direct_compile(code)
         return
 
+    if args[0] == "--batch":
+        rest = args[1:]
+        jobs, as_json = None, False
+        while rest and rest[0] in ("--jobs", "--json"):
+            if rest[0] == "--json":
+                as_json = True
+                rest = rest[1:]
+            else:
+                jobs = int(rest[1])
+                rest = rest[2:]
+        if not rest:
+            print("error: --batch requires scripts or a manifest")
+            return
+        if run_batch(batch_scripts(rest), jobs, as_json):
+            sys.exit(1)
+        return
+
+    if args[0] == "--profile":
+        rest = args[1:]
+        outputs = {}
+        while len(rest) > 1 and rest[0] in ("--json", "--collapsed"):
+            outputs[rest[0][2:]] = rest[1]
+            rest = rest[2:]
+        if not rest:
+            print("error: --profile requires a file or --drun code")
+            return
+        run_profiled(rest, outputs)
+        return
+
+    if args[0] == "--serve":
+        status = serve(args[1] if len(args) > 1 else default_socket_path())
+        if status:
+            sys.exit(status)
+        return
+
+    if args[0] == "--remote":
+        if len(args) < 2:
+            print("error: --remote requires a file or --drun code")
+            return
+        if args[1] == "--drun":
+            request = {"code": " ".join(args[2:])}
+        else:
+            request = {"run": os.path.abspath(args[1])}
+        status = remote(request, default_socket_path())
+        if status:
+            sys.exit(status)
+        return
+
     print(f"error: unknown command '{args[0]}'")
     print_usage()
 
@@ -1114,12 +4008,27 @@ def print_usage():
         r"""usage:
   capy --ver
   capy --run <file>
+  capy --stream <file>
+  capy --compile <file> [<file> ...]
   capy --drun <command> <arguements>
+  capy --batch [--jobs N] [--json] <file|manifest> [...]
+  capy --profile [--json OUT] [--collapsed OUT] <file>
+  capy --profile [--json OUT] [--collapsed OUT] --drun <command> <arguements>
+  capy --serve [<socket>]
+  capy --remote <file>
+  capy --remote --drun <command> <arguements>
 
 commands:
   --ver        show version
-  --run FILE   run a source file
+  --run FILE   run a source file (- streams from stdin)
+  --stream FILE  run a file while it is read, with bounded memory
+  --compile FILE...  build the compiled cache ahead of time
   --drun "CODE"  run code directly
+  --batch ...  run many scripts on a process pool (one per core by default)
+  --profile ...  run with per-line and per-command timing, reported on exit;
+               --json / --collapsed also write it out (collapsed stacks for flamegraphs)
+  --serve [SOCKET]  keep a warm interpreter on a Unix socket ($CAPY_SOCKET)
+  --remote FILE  run a file (or --drun code) on a running --serve interpreter
 """
     )
 
@@ -1130,6 +4039,3 @@ if __name__ == "__main__":
 
     elif mode == "debug":
         CapyCompiler().compile()
-        
-elif __name__ != "__main__":
-    main()
\ No newline at end of file
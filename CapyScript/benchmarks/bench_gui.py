@@ -0,0 +1,59 @@
+"""
+GUI construction benchmark: build a window of N labelled buttons laid out
+with capygui.grid, one layout at a time vs. inside capygui.begin_batch /
+end_batch. Needs customtkinter and a display.
+
+usage: python benchmarks/bench_gui.py [widgets]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import CapyCompiler as capy
+
+COLUMNS = 20
+
+
+def build_script(count, batched):
+    lines = ["base.import capygui", "capygui.Window app 1200x800 Bench", "capygui.Frame app body"]
+    lines.append("capygui.pack body fill=both expand=true")
+    if batched:
+        lines.append("capygui.begin_batch")
+    for i in range(count):
+        kind = "Label" if i % 2 else "Button"
+        lines.append(f"capygui.{kind} body w{i} item{i}")
+        lines.append(f"capygui.grid w{i} {i // COLUMNS} {i % COLUMNS}")
+    if batched:
+        lines.append("capygui.end_batch")
+    lines.append("capygui.update all")
+    return lines
+
+
+def measure(count, batched):
+    compiler = capy.CapyCompiler(capy.Context())
+    program = compiler.compile_lines(build_script(count, batched))
+    start = time.perf_counter()
+    compiler.execute(program)
+    elapsed = time.perf_counter() - start
+    for app in compiler.context.apps.values():
+        app.destroy()
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    try:
+        immediate = measure(count, batched=False)
+    except Exception as e:
+        print(f"unavailable ({e})")
+        return
+    batched = measure(count, batched=True)
+    print(f"{count} widgets")
+    print(f"  layout per widget : {immediate:8.3f}s  {count / immediate:10,.0f} widgets/s")
+    print(f"  batched layout    : {batched:8.3f}s  {count / batched:10,.0f} widgets/s")
+    print(f"  speedup           : {immediate / batched:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: math.* commands through the compiled numeric path vs. the
+original string round-trip (split, resolve_variables, str -> float).
+
+usage: python benchmarks/bench_math.py [iterations]
+"""
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import CapyCompiler as capy
+
+PROGRAM = [
+    "math.add $A 1 A",
+    "math.mul $A 3 B",
+    "math.mod $B 7 C",
+    "math.sub $C $A D",
+    "math.div $B 2 E",
+]
+
+# --- The pre-compile implementation, kept here as the baseline ---
+_VAR_PATTERN = re.compile(r'\$(\w+)|\$\{([^}]+)\}')
+
+
+def _legacy_resolve(text, registers):
+    def _repl(match):
+        name = match.group(1) or match.group(2)
+        if name in registers:
+            return str(registers[name])
+        return "<undefined:{name}>".format(name=name)
+
+    return _VAR_PATTERN.sub(_repl, text)
+
+
+def _legacy_binary(op):
+    def handler(args, registers):
+        args = args.split(" ")
+        target1, target2, dest = args[0], args[1], args[2]
+        val1 = float(_legacy_resolve(target1, registers))
+        val2 = float(_legacy_resolve(target2, registers))
+        registers[dest] = op(val1, val2)
+    return handler
+
+
+_LEGACY = {
+    "math.add": _legacy_binary(lambda a, b: a + b),
+    "math.sub": _legacy_binary(lambda a, b: a - b),
+    "math.mul": _legacy_binary(lambda a, b: a * b),
+    "math.div": _legacy_binary(lambda a, b: a / b),
+    "math.mod": _legacy_binary(lambda a, b: a % b),
+}
+
+
+def run_legacy(iterations):
+    registers = {"A": 0}
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for line in PROGRAM:
+            line = line.strip()
+            parts = line.split(" ", 1)
+            _LEGACY[parts[0]](parts[1], registers)
+    return time.perf_counter() - start
+
+
+def run_compiled(iterations):
+    # The loop runs inside the script, as it would in a real one
+    compiler = capy.CapyCompiler(capy.Context())
+    program = compiler.compile_lines(
+        ["base.import math", "base.import io", "io.local A 0", f"base.repeat {iterations}"] + PROGRAM + ["base.end"]
+    )
+    start = time.perf_counter()
+    compiler.execute(program)
+    return time.perf_counter() - start
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    ops = iterations * len(PROGRAM)
+    legacy = run_legacy(iterations)
+    compiled = run_compiled(iterations)
+    print(f"{ops} math ops")
+    print(f"  string round-trip : {legacy:8.3f}s  {ops / legacy:12,.0f} ops/s")
+    print(f"  compiled numeric  : {compiled:8.3f}s  {ops / compiled:12,.0f} ops/s")
+    print(f"  speedup           : {legacy / compiled:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Physics benchmark: bodies advanced per second by physics.step, with and
+without collisions, against the same integration written as one math.* line
+per body per axis (the only way to do it before modules/physics.py).
+
+usage: python benchmarks/bench_physics.py [bodies] [steps]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import CapyCompiler as capy
+
+SCRIPT_BODIES = 200  # the per-line version is too slow to run at full size
+
+
+def run(lines):
+    compiler = capy.CapyCompiler(capy.Context())
+    program = compiler.compile_lines(lines)
+    start = time.perf_counter()
+    compiler.execute(program)
+    return time.perf_counter() - start
+
+
+def time_steps(bodies, steps, radius):
+    # Builds and warms up a world, then times the physics.step line alone
+    compiler = capy.CapyCompiler(capy.Context())
+    setup = compiler.compile_lines([
+        "base.import physics",
+        "physics.world 0 400 2000 2000 W",
+        f"physics.scatter W {bodies} {radius} 80 1",
+        "physics.step W 0.016 2",  # first steps pay numpy's one-time costs
+    ])
+    compiler.execute(setup)
+    step = compiler.compile_lines([f"physics.step W 0.016 {steps}"])
+    start = time.perf_counter()
+    compiler.execute(step)
+    return time.perf_counter() - start
+
+
+def per_line_script(bodies, steps):
+    lines = ["base.import math", "base.import io"]
+    for i in range(bodies):
+        lines += [f"io.local X{i} {i}", f"io.local Y{i} 0", f"io.local VX{i} 1", f"io.local VY{i} 0"]
+    lines.append(f"base.repeat {steps}")
+    for i in range(bodies):
+        lines += [
+            f"math.add $VY{i} 6.4 VY{i}",
+            f"math.mul $VX{i} 0.016 D",
+            f"math.add $X{i} $D X{i}",
+            f"math.mul $VY{i} 0.016 D",
+            f"math.add $Y{i} $D Y{i}",
+        ]
+    lines.append("base.end")
+    return lines
+
+
+def main():
+    bodies = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    if capy.np is None:
+        print("unavailable (physics requires numpy)")
+        return
+    free = time_steps(bodies, steps, 0)
+    colliding = time_steps(bodies, steps, 4)
+    script_steps = max(1, steps // 10)
+    per_line = run(per_line_script(SCRIPT_BODIES, script_steps))
+    print(f"{bodies} bodies x {steps} steps")
+    print(f"  math.* per body ({SCRIPT_BODIES}) : {SCRIPT_BODIES * script_steps / per_line:14,.0f} bodies/s")
+    print(f"  physics.step, no collisions: {bodies * steps / free:14,.0f} bodies/s")
+    print(f"  physics.step, colliding    : {bodies * steps / colliding:14,.0f} bodies/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Startup benchmark: wall time of a console-only script (io/math/time, GUI
+toolkit never imported) vs. the same script after `base.import capygui`,
+which loads customtkinter/tkinter like every run used to.
+
+usage: python benchmarks/bench_startup.py [runs]
+"""
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ENTRY = Path(__file__).resolve().parent.parent / "CapyCompiler.py"
+
+CONSOLE = "base.import io; base.import math; base.import time; math.add 1 2 A; io.write $A"
+WITH_GUI = "base.import capygui; " + CONSOLE
+
+
+def measure(code, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, str(ENTRY), "--drun", code],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        samples.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return None, lines[-1] if lines else f"exit status {proc.returncode}"
+    return statistics.median(samples), None
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    console, error = measure(CONSOLE, runs)
+    print(f"median of {runs} runs")
+    if console is None:
+        print(f"  console only        : unavailable ({error})")
+        return
+    print(f"  console only        : {console * 1000:8.1f} ms")
+
+    gui, error = measure(WITH_GUI, runs)
+    if gui is None:
+        print(f"  with capygui import : unavailable ({error})")
+        return
+    print(f"  with capygui import : {gui * 1000:8.1f} ms")
+    print(f"  saved by lazy import: {(gui - console) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Particle / rigid-circle physics for CapyScript.
+
+A world keeps its bodies column-wise in contiguous numpy arrays (positions,
+velocities, masses, radii), so one physics.step advances every body with a
+handful of array operations instead of one math.* line per body per axis.
+Collisions use a spatial hash: bodies are hashed by the grid cell (twice the
+largest radius wide) they sit in, and only pairs in the same or adjacent
+cells are tested.
+
+    base.import physics
+    physics.world 0 400 800 600 W        # [gravity_x gravity_y width height restitution] DEST
+    physics.scatter W 2000 3 80          # count [radius speed seed]
+    physics.add_body W 400 50 0 0 0 40   # x y [vx vy mass radius]; mass 0 is immovable
+    physics.step W 0.016 4               # dt [steps]
+    physics.get W x 0 X                  # field [index] DEST; no index gives a Vector
+    physics.draw W canvas fill=#3b8ed0   # sync a capygui.Canvas with the bodies
+
+Bodies are numbered from 0 in the order they were added. y grows downwards,
+as on a canvas, so a positive gravity_y pulls bodies to the bottom edge.
+"""
+from CapyCompiler import Register, capygui, command, make_vector
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise Exception(f"physics requires numpy: {e}")
+
+FIELDS = ("x", "y", "vx", "vy", "mass", "radius")
+
+_NEIGHBOURS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))  # each adjacent pair of cells once
+
+
+class World:
+    """Simulation state; slots past `count` are spare capacity."""
+
+    def __init__(self, gravity=(0.0, 0.0), bounds=(0.0, 0.0), restitution=0.9, capacity=64):
+        self.gravity = np.array(gravity, dtype=np.float64)
+        self.bounds = bounds
+        self.restitution = restitution
+        self.iterations = 4  # overlap fix-up passes per step
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.mass = np.zeros(capacity)
+        self.inv_mass = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.drawn = {}  # canvas name -> (canvas, item ids, last drawn boxes)
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f"<World {self.count} bodies>"
+
+
+def _world(value):
+    if not isinstance(value, World):
+        raise Exception(f"{value!r} is not a physics world")
+    return value
+
+
+def _reserve(world, extra):
+    needed = world.count + extra
+    capacity = len(world.mass)
+    if needed <= capacity:
+        return
+    capacity = max(needed, capacity * 2)
+    for name in ("pos", "vel", "mass", "inv_mass", "radius"):
+        old = getattr(world, name)
+        grown = np.zeros((capacity,) + old.shape[1:])
+        grown[:world.count] = old[:world.count]
+        setattr(world, name, grown)
+
+
+def _add(world, pos, vel, mass, radius):
+    _reserve(world, len(mass))
+    added = slice(world.count, world.count + len(mass))
+    world.pos[added] = pos
+    world.vel[added] = vel
+    world.mass[added] = mass
+    world.inv_mass[added] = np.divide(1.0, mass, out=np.zeros(len(mass)), where=mass > 0)
+    world.radius[added] = radius
+    world.count += len(mass)
+
+
+def _column(world, field):
+    n = world.count
+    columns = {
+        "x": world.pos[:n, 0],
+        "y": world.pos[:n, 1],
+        "vx": world.vel[:n, 0],
+        "vy": world.vel[:n, 1],
+        "mass": world.mass[:n],
+        "radius": world.radius[:n],
+    }
+    try:
+        return columns[field]
+    except KeyError:
+        raise Exception(f"unknown body field {field!r}, expected one of {', '.join(FIELDS)}") from None
+
+
+def _hash(cx, cy, mask):
+    return ((cx * 73856093) ^ (cy * 19349663)) & mask
+
+
+def _pairs(pos, radius):
+    """Candidate (a, b) index arrays: bodies in the same or adjacent cells."""
+    n = len(pos)
+    cell = 2.0 * radius.max()
+    if cell <= 0:
+        return None
+    cells = np.floor(pos / cell).astype(np.int64)
+    mask = (1 << max(n * 2 - 1, 1).bit_length()) - 1  # about two buckets per body
+    buckets = _hash(cells[:, 0], cells[:, 1], mask)
+    order = np.argsort(buckets, kind="stable")
+    cells = cells[order]
+    sizes = np.bincount(buckets, minlength=mask + 1)
+    starts = np.cumsum(sizes) - sizes
+    index = np.arange(n)
+    firsts, seconds = [], []
+    for dx, dy in _NEIGHBOURS:
+        bucket = _hash(cells[:, 0] + dx, cells[:, 1] + dy, mask)
+        hi = starts[bucket] + sizes[bucket]
+        # within its own bucket, a body only pairs with the ones sorted after it
+        lo = index + 1 if (dx, dy) == (0, 0) else starts[bucket]
+        counts = hi - lo
+        total = int(counts.sum())
+        if not total:
+            continue
+        a = np.repeat(index, counts)
+        b = lo[a] + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        # other cells that share the bucket are not neighbours
+        offset = cells[b] - cells[a]
+        keep = (offset[:, 0] == dx) & (offset[:, 1] == dy)
+        firsts.append(order[a[keep]])
+        seconds.append(order[b[keep]])
+    if not firsts:
+        return None
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def _accumulate(index, values, n):
+    # Per-body sums of per-contact (k, 2) values
+    return np.column_stack((
+        np.bincount(index, values[:, 0], n),
+        np.bincount(index, values[:, 1], n),
+    ))
+
+
+def _contacts(pos, radius, inv, a, b):
+    # The touching pairs among the candidates, with unit normals from a to b
+    delta = pos[b] - pos[a]
+    dist2 = np.einsum("ij,ij->i", delta, delta)
+    reach = radius[a] + radius[b]
+    hit = np.flatnonzero((dist2 < reach * reach) & (inv[a] + inv[b] > 0))
+    a, b, delta, reach = a[hit], b[hit], delta[hit], reach[hit]
+    dist = np.sqrt(dist2[hit])
+    normal = delta / np.where(dist > 0, dist, 1.0)[:, None]
+    normal[dist == 0] = (1.0, 0.0)
+    return a, b, normal, reach - dist
+
+
+def _shares(inv, a, b, n):
+    # Per-contact weights for a and b: a body's inverse mass split over all
+    # of its contacts, so one in a crowded pile is not pushed several times over
+    contacts = np.bincount(a, minlength=n) + np.bincount(b, minlength=n)
+    total = inv[a] + inv[b]
+    return (inv[a] / total / contacts[a])[:, None], (inv[b] / total / contacts[b])[:, None]
+
+
+def _walls(world):
+    # Clamp positions inside the bounds; returns per-axis masks of the bodies that hit
+    width, height = world.bounds
+    if width <= 0 or height <= 0:
+        return ()
+    n = world.count
+    radius = world.radius[:n]
+    hits = []
+    for axis, limit in ((0, width), (1, height)):
+        p = world.pos[:n, axis]
+        low, high = p < radius, p > limit - radius
+        p[low] = radius[low]
+        p[high] = limit - radius[high]
+        hits.append((axis, low, high))
+    return hits
+
+
+def _step(world, dt):
+    """
+    Position-based step: move every body, push overlapping ones apart a few
+    times (fixing one overlap can open another), take the velocities from
+    how far the bodies actually moved, then restore the bounce that the
+    position fix-up removed, scaled by the restitution.
+    """
+    n = world.count
+    pos, vel, inv, radius = world.pos[:n], world.vel[:n], world.inv_mass[:n], world.radius[:n]
+    if world.gravity.any():
+        vel += (world.gravity * dt) * (inv > 0)[:, None]
+    start, before = pos.copy(), vel.copy()
+    pos += vel * dt
+
+    pairs = _pairs(pos, radius) if n > 1 else None  # the broad phase runs once per step
+    touched = None
+    for _ in range(world.iterations if pairs is not None else 0):
+        a, b, normal, depth = _contacts(pos, radius, inv, *pairs)
+        if not len(a):
+            break
+        if touched is None:
+            touched = a, b
+        share_a, share_b = _shares(inv, a, b, n)
+        push = depth[:, None] * normal
+        pos += _accumulate(b, push * share_b, n) - _accumulate(a, push * share_a, n)
+    walls = _walls(world)
+    vel[:] = (pos - start) / dt
+
+    if touched is not None:
+        _bounce(world, before, *touched)
+    for axis, low, high in walls:
+        v = vel[:, axis]
+        v[low] = np.abs(before[low, axis]) * world.restitution
+        v[high] = -np.abs(before[high, axis]) * world.restitution
+
+
+def _bounce(world, before, a, b):
+    # Set the separating speed of each pair that collided to restitution
+    # times the speed it closed at before the step
+    n = world.count
+    pos, vel, inv = world.pos[:n], world.vel[:n], world.inv_mass[:n]
+    delta = pos[b] - pos[a]
+    dist = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+    normal = delta / np.where(dist > 0, dist, 1.0)[:, None]
+    closing = np.einsum("ij,ij->i", before[b] - before[a], normal)
+    now = np.einsum("ij,ij->i", vel[b] - vel[a], normal)
+    change = (np.where(closing < 0, -world.restitution * closing, 0.0) - now)[:, None] * normal
+    share_a, share_b = _shares(inv, a, b, n)
+    vel += _accumulate(b, change * share_b, n) - _accumulate(a, change * share_a, n)
+
+
+class physics:
+    @staticmethod
+    @command
+    def world(gravity_x: float = 0.0, gravity_y: float = 0.0, width: float = 0.0, height: float = 0.0,
+              restitution: float = 0.9) -> object:
+        # A width and height of 0 leave the world unbounded
+        return World((gravity_x, gravity_y), (width, height), restitution)
+
+    @staticmethod
+    @command
+    def add_body(world: Register, x: float, y: float, vx: float = 0.0, vy: float = 0.0,
+                 mass: float = 1.0, radius: float = 1.0):
+        _add(_world(world), [[x, y]], [[vx, vy]], np.array([mass]), [radius])
+
+    @staticmethod
+    @command
+    def scatter(world: Register, count: int, radius: float = 2.0, speed: float = 0.0, seed: int = -1):
+        # `count` bodies of mass 1 at random places inside the bounds, moving in random directions
+        world = _world(world)
+        width, height = world.bounds
+        if width <= 0 or height <= 0:
+            raise Exception("physics.scatter needs a world with a width and height")
+        rng = np.random.default_rng(None if seed < 0 else seed)
+        pos = rng.uniform((radius, radius), (width - radius, height - radius), (count, 2))
+        angle = rng.uniform(0.0, 2 * np.pi, count)
+        vel = np.column_stack((np.cos(angle), np.sin(angle))) * (speed * rng.uniform(0.0, 1.0, count))[:, None]
+        _add(world, pos, vel, np.ones(count), np.full(count, radius))
+
+    @staticmethod
+    @command
+    def step(world: Register, dt: float, steps: int = 1):
+        world = _world(world)
+        if dt <= 0:
+            raise Exception("physics.step: dt must be greater than 0")
+        for _ in range(steps):
+            _step(world, dt)
+
+    @staticmethod
+    @command
+    def get(world: Register, field: str, index: int = -1) -> object:
+        # physics.get W count DEST | physics.get W FIELD [INDEX] DEST
+        world = _world(world)
+        if field == "count":
+            return world.count
+        column = _column(world, field)
+        if index < 0:
+            return make_vector(column)
+        if index >= world.count:
+            raise Exception(f"physics.get: there is no body {index}")
+        return float(column[index])
+
+    @staticmethod
+    @command
+    def set(world: Register, index: int, field: str, value: float):
+        world = _world(world)
+        if not 0 <= index < world.count:
+            raise Exception(f"physics.set: there is no body {index}")
+        _column(world, field)[index] = value
+        if field == "mass":
+            world.inv_mass[index] = 1.0 / value if value > 0 else 0.0
+
+    @staticmethod
+    @command
+    def clear(world: Register):
+        _world(world).count = 0
+
+    @staticmethod
+    @command
+    def draw(world: Register, canvas: str, *options: str):
+        """
+        Move one oval per body on a capygui.Canvas. Only bodies whose pixel
+        box changed since the last draw are touched; the options (fill=,
+        outline=, ...) style the ovals as they are created.
+        """
+        world = _world(world)
+        target = capygui.elements.get(canvas)
+        if target is None:
+            raise Exception(f"physics.draw: no canvas named {canvas!r}")
+        _, style = capygui._parse_kwargs(options)
+        style.setdefault("fill", "#3b8ed0")
+        style.setdefault("outline", "")
+
+        n = world.count
+        radius = world.radius[:n, None]
+        boxes = np.rint(np.hstack((world.pos[:n] - radius, world.pos[:n] + radius))).astype(np.int64)
+        drawn, items, last = world.drawn.get(canvas, (None, [], boxes[:0]))
+        if drawn is not target:  # first draw, or a new canvas under the same name
+            items, last = [], boxes[:0]
+        if len(items) > n:
+            target.delete(*items[n:])
+            del items[n:]
+            last = last[:n]
+        rows = boxes.tolist()
+        kept = len(items)
+        for i in np.flatnonzero((boxes[:kept] != last).any(axis=1)).tolist():
+            target.coords(items[i], *rows[i])
+        for i in range(kept, n):
+            items.append(target.create_oval(*rows[i], **style))
+        world.drawn[canvas] = (target, items, boxes)
@@ -0,0 +1,39 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import CapyCompiler as capy
+
+
+class Script:
+    """A compiler on a fresh Context whose console output is captured."""
+
+    def __init__(self):
+        self.output = io.StringIO()
+        self.context = capy.Context()
+        self.context.console = capy.ConsoleOutput(line_buffered=False, stream=self.output)
+        self.compiler = capy.CapyCompiler(self.context)
+
+    @property
+    def registers(self):
+        return self.context.registers
+
+    def compile(self, *lines):
+        return self.compiler.compile_lines(lines)
+
+    def run(self, *lines):
+        self.compiler.execute(self.compile(*lines))
+        return self.output.getvalue().splitlines()
+
+    def stream(self, *lines):
+        self.compiler.stream(lines)
+        return self.output.getvalue().splitlines()
+
+
+@pytest.fixture
+def script():
+    return Script()
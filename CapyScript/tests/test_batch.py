@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from conftest import capy
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def write_scripts(folder):
+    (folder / "a.capy").write_text("base.import io\nio.write a\n")
+    (folder / "b.capy").write_text("base.import io\nbase.import math\nio.write b\nmath.add $NOPE 1 X\n")
+    (folder / "sub").mkdir()
+    (folder / "sub" / "c.capy").write_text("base.import math\nmath.add 1 2 A\n")
+
+
+def test_batch_scripts_expands_manifests_relative_to_themselves(tmp_path):
+    write_scripts(tmp_path)
+    manifest = tmp_path / "jobs.txt"
+    manifest.write_text("# nightly\nsub/c.capy\n\na.capy\n")
+    scripts = capy.batch_scripts([str(tmp_path / "b.capy"), str(manifest)])
+    assert scripts == [str(tmp_path / name) for name in ("b.capy", os.path.join("sub", "c.capy"), "a.capy")]
+
+
+def test_batch_job_captures_output_and_errors(tmp_path):
+    write_scripts(tmp_path)
+    ok = capy._batch_job(str(tmp_path / "a.capy"))
+    assert (ok["status"], ok["stdout"], ok["error"]) == (0, "a\n", None)
+    failed = capy._batch_job(str(tmp_path / "b.capy"))
+    assert failed["status"] == 1
+    assert failed["stdout"] == "b\n"
+    assert "NOPE" in failed["error"]
+    assert "registers" not in failed
+
+
+def test_batch_cli_runs_every_script_and_fails_if_any_did(tmp_path):
+    write_scripts(tmp_path)
+    scripts = [str(tmp_path / name) for name in ("a.capy", "b.capy", "sub/c.capy")]
+    done = subprocess.run(
+        [sys.executable, str(ROOT / "CapyCompiler.py"), "--batch", "--jobs", "2", "--json", *scripts],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert done.returncode == 1
+    results = json.loads(done.stdout)
+    assert [(r["script"], r["status"]) for r in results] == list(zip(scripts, (0, 1, 0)))
+    assert results[0]["stdout"] == "a\n"
@@ -0,0 +1,69 @@
+import os
+
+from conftest import Script, capy
+
+
+SOURCE = "\n".join([
+    "base.import io",
+    "base.import math",
+    "base.repeat 3 i",
+    "math.add $i 10 X",
+    "io.write $X",
+    "base.end",
+])
+
+
+def test_cache_round_trip(tmp_path):
+    path = tmp_path / "job.capy"
+    path.write_text(SOURCE)
+    first = Script()
+    first.compiler.compile(str(path))
+    assert capy.CapyCompiler.cache_path(str(path)).exists()
+
+    second = Script()
+    program = second.compiler.load_cache(str(path))
+    assert program is not None
+    assert [ins.command for ins in program] == ["base.repeat", "math.add", "io.write", "base.end"]
+    assert second.compiler.imports == ["io", "math"]
+    second.compiler.execute(program)
+    assert second.output.getvalue() == first.output.getvalue() == "10\n11\n12\n"
+
+
+def test_cache_is_rejected_after_an_edit_and_kept_after_a_touch(tmp_path):
+    path = tmp_path / "job.capy"
+    path.write_text(SOURCE)
+    Script().compiler.compile_file(str(path))
+
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    assert Script().compiler.load_cache(str(path)) is not None  # same content, new mtime
+
+    path.write_text(SOURCE.replace("10", "20"))
+    assert Script().compiler.load_cache(str(path)) is None
+
+
+def test_cache_is_written_beside_the_script_in_capycache(tmp_path):
+    path = tmp_path / "job.capy"
+    path.write_text(SOURCE)
+    Script().compiler.compile_file(str(path))
+    cached = capy.CapyCompiler.cache_path(str(path))
+    assert cached.parent == tmp_path / capy.CACHE_DIR
+    assert cached.name.startswith("job.capy-")
+
+
+def test_use_cache_false_neither_reads_nor_writes(tmp_path):
+    path = tmp_path / "job.capy"
+    path.write_text(SOURCE)
+    Script().compiler.compile_file(str(path), use_cache=False)
+    assert not capy.CapyCompiler.cache_path(str(path)).exists()
+
+
+def test_corrupt_cache_is_ignored(tmp_path):
+    path = tmp_path / "job.capy"
+    path.write_text(SOURCE)
+    Script().compiler.compile_file(str(path))
+    capy.CapyCompiler.cache_path(str(path)).write_bytes(b"not a cache")
+    script = Script()
+    assert script.compiler.load_cache(str(path)) is None
+    script.compiler.compile(str(path))
+    assert script.output.getvalue() == "10\n11\n12\n"
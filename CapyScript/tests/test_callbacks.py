@@ -0,0 +1,35 @@
+from conftest import capy
+
+
+def test_loops_in_separately_compiled_programs_keep_their_own_counters(script):
+    # A callback body is its own program; its loop must not reset the script's
+    callback = capy.CapyCompiler(script.context).compile_lines(["base.repeat 5", "base.end"])
+    script.context.commands["test.callback"] = lambda arg: capy.CapyCompiler._run(callback)
+    assert script.run(
+        "base.import io",
+        "base.repeat 3 i",
+        "test.callback",
+        "io.write $i",
+        "base.end",
+    ) == ["0", "1", "2"]
+
+
+def test_linking_programs_does_not_intern_new_registers(script):
+    # Servers and GUIs link a program per request/callback; loop state stays
+    # with the program instead of growing the shared slot table
+    lines = ["base.repeat 2 i", "base.repeat 2", "base.end", "base.end"]
+    capy.CapyCompiler(script.context).compile_lines(lines)
+    slots = len(capy._SLOT_NAMES)
+    for _ in range(50):
+        capy.CapyCompiler(script.context).compile_lines(lines)
+    assert len(capy._SLOT_NAMES) == slots
+
+
+def test_callback_compiles_its_source_once(script):
+    with script.context.activate(), capy.console_stdout():
+        callback = capy.Callback("base.import io; base.repeat 2 i; io.write tick $i; base.end")
+        program = callback.program
+        callback()
+        callback()
+    assert callback.program is program
+    assert script.output.getvalue().splitlines() == ["tick 0", "tick 1"] * 2
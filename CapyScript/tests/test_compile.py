@@ -0,0 +1,35 @@
+from unittest import mock
+
+import pytest
+
+from conftest import capy
+
+
+def test_imports_run_at_compile_time_only(script):
+    program = script.compile("base.import io", "base.import math", "io.write hi")
+    assert [ins.command for ins in program] == ["io.write"]
+    assert script.compiler.imports == ["io", "math"]
+
+
+def test_imports_load_each_module_once(script):
+    with mock.patch.object(capy, "_exports", wraps=capy._exports) as exports:
+        script.run("base.import math", "math.add 1 2 A")
+    assert exports.call_count == 1
+
+
+def test_blank_lines_and_comments_compile_to_nothing(script):
+    program = script.compile("", "   ", "# note", "base.import io", "io.write hi")
+    assert len(program) == 1
+    assert program[0].line == 5
+
+
+def test_instructions_hold_their_handler_and_operands(script):
+    ins, = script.compile("base.import math", "math.add 1 $B C")
+    assert ins.command == "math.add"
+    assert ins.handler is script.context.commands["math.add"]
+    assert ins.operands == ("1", "$B", "C")
+
+
+def test_unknown_command_is_a_compile_error(script):
+    with pytest.raises(Exception, match="Unknown command: nope.cmd"):
+        script.compile("nope.cmd 1")
@@ -0,0 +1,45 @@
+import io
+
+from conftest import capy
+
+
+def test_print_from_handlers_stays_in_order_with_io_write(script):
+    script.context.commands["test.print"] = lambda arg: print(arg)
+    assert script.run("base.import io", "io.write first", "test.print second", "io.write third") == [
+        "first", "second", "third",
+    ]
+
+
+def test_stdout_stays_writable_while_a_script_runs(script):
+    seen = []
+    script.context.commands["test.check"] = lambda arg: seen.append(capy.sys.stdout.writable())
+    script.run("test.check")
+    assert seen == [True]
+
+
+def test_output_is_held_until_flushed():
+    out = io.StringIO()
+    console = capy.ConsoleOutput(line_buffered=False, stream=out)
+    console.write("a\n")
+    console.write("b\n")
+    assert out.getvalue() == ""
+    console.flush()
+    assert out.getvalue() == "a\nb\n"
+
+
+def test_line_buffered_output_flushes_each_line():
+    out = io.StringIO()
+    console = capy.ConsoleOutput(line_buffered=True, stream=out)
+    console.write("partial")
+    assert out.getvalue() == ""
+    console.write(" line\n")
+    assert out.getvalue() == "partial line\n"
+
+
+def test_full_buffer_flushes():
+    out = io.StringIO()
+    console = capy.ConsoleOutput(size=8, line_buffered=False, stream=out)
+    console.write("1234")
+    assert out.getvalue() == ""
+    console.write("5678")
+    assert out.getvalue() == "12345678"
@@ -0,0 +1,56 @@
+import threading
+
+from conftest import Script, capy
+
+
+def test_contexts_do_not_share_registers_or_imports():
+    first, second = Script(), Script()
+    first.run("base.import math", "math.add 1 2 A")
+    assert first.registers["A"] == 3
+    assert "A" not in second.registers
+    assert "math.add" in first.context.commands
+    assert "math.add" not in second.context.commands
+
+
+def test_fork_copies_registers_and_imports_without_sharing_them(script):
+    script.run("base.import math", "math.add 1 2 A")
+    forked = script.compiler.fork()
+    assert forked.imports == ["math"]
+    assert forked.context.registers["A"] == 3
+    forked.execute(forked.compile_lines(["math.add $A 10 A"]))
+    assert forked.context.registers["A"] == 13
+    assert script.registers["A"] == 3
+
+
+def test_reset_forgets_registers_and_imported_commands(script):
+    script.run("base.import math", "math.add 1 2 A")
+    script.compiler.reset()
+    assert "A" not in script.registers
+    assert "math.add" not in script.context.commands
+    assert script.compiler.imports == []
+    assert "base.import" in script.context.commands
+
+
+def test_concurrent_contexts_keep_module_print_in_their_own_console():
+    # The first run to finish must not take sys.stdout away from the other
+    results = {}
+
+    def job(name, delay):
+        script = Script()
+        script.context.commands["test.print"] = lambda arg: print(arg)
+        results[name] = script.run(
+            "base.import io",
+            "base.import time",
+            f"io.write {name}1",
+            f"time.sleep {delay}",
+            f"test.print {name}2",
+            f"io.write {name}3",
+        )
+
+    threads = [threading.Thread(target=job, args=("a", 0.02)), threading.Thread(target=job, args=("b", 0.2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {"a": ["a1", "a2", "a3"], "b": ["b1", "b2", "b3"]}
+    assert not isinstance(capy.sys.stdout, capy.ConsoleStream)
@@ -0,0 +1,88 @@
+import pytest
+
+from conftest import capy
+
+
+@pytest.fixture
+def files(script, tmp_path):
+    script.run("base.import file", "base.import io")
+    script.dir = tmp_path
+    return script
+
+
+def test_write_then_read_lines(files):
+    path = files.dir / "out.txt"
+    files.run(
+        f"file.create O {path}",
+        "file.write $O first",
+        "file.put $O sec",
+        "file.write $O ond",
+        "file.close $O",
+        f"file.append O {path}",
+        "file.write $O third",
+        "file.close $O",
+    )
+    assert path.read_text() == "first\nsecond\nthird\n"
+
+    lines = files.run(
+        f"file.open F {path}",
+        "file.readline $F L MORE",
+        "base.while $MORE == 1",
+        "io.write got $L",
+        "file.readline $F L MORE",
+        "base.end",
+        "file.close $F",
+    )
+    assert lines == ["got first", "got second", "got third"]
+
+
+def test_chunked_reads(files):
+    path = files.dir / "data.txt"
+    path.write_text("abcdefg")
+    files.run(
+        f"file.open F {path}",
+        "file.read $F 3 A MORE",
+        "file.read $F 3 B",
+        "file.read $F 3 C",
+        "file.read $F 3 D END",
+        "file.size $F SIZE",
+    )
+    regs = files.registers
+    assert (regs["A"], regs["B"], regs["C"], regs["D"]) == ("abc", "def", "g", "")
+    assert (regs["MORE"], regs["END"], regs["SIZE"]) == (1, 0, 7)
+
+
+def test_memory_map_find_and_slice(files):
+    path = files.dir / "huge.bin"
+    path.write_bytes(b"....ERROR: disk full....ERROR: again")
+    lines = files.run(
+        f"file.map M {path}",
+        "file.find $M ERROR 0 P",
+        "file.find $M ERROR 5 Q",
+        "file.find $M missing 0 R",
+        "file.slice $M $P 16 S",
+        "file.size $M SIZE",
+        "io.write $S",
+    )
+    regs = files.registers
+    assert (regs["P"], regs["Q"], regs["R"], regs["SIZE"]) == (4, 24, -1, 36)
+    assert bytes(regs["S"]) == b"ERROR: disk full"
+    assert lines == ["ERROR: disk full"]
+
+
+def test_handles_are_tracked_and_closed_with_the_context(files):
+    path = files.dir / "out.txt"
+    files.run(f"file.create O {path}", "file.put $O unflushed", f"file.map M {__file__}")
+    handle = files.registers["O"]
+    assert handle in files.context.files
+    capy.close_files(files.context)
+    assert not files.context.files
+    assert path.read_text() == "unflushed"
+
+
+def test_non_file_registers_are_rejected_and_close_forgets_the_handle(files):
+    path = files.dir / "out.txt"
+    with pytest.raises(Exception, match="is not an open file"):
+        files.run("io.local X 1", "file.readline $X L")
+    files.run(f"file.create O {path}", "file.close $O")
+    assert not files.context.files
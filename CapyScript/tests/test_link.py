@@ -0,0 +1,91 @@
+import pytest
+
+from conftest import capy
+
+
+# --- link(): labels, loops, break/continue ---
+
+def test_goto_and_if_jump_to_labels(script):
+    assert script.run(
+        "base.import io",
+        "base.goto skip",
+        "io.write never",
+        "base.label skip",
+        "io.write done",
+    ) == ["done"]
+
+
+def test_backward_if_loop(script):
+    lines = script.run(
+        "base.import io",
+        "base.import math",
+        "io.local N 0",
+        "base.label top",
+        "math.add $N 1 N",
+        "base.if $N < 3 top",
+        "io.write N=$N",
+    )
+    assert lines == ["N=3"]
+
+
+def test_duplicate_and_unknown_labels_are_compile_errors(script):
+    with pytest.raises(Exception, match="duplicate label 'a'"):
+        script.compile("base.label a", "base.label a")
+    with pytest.raises(Exception, match="unknown label 'nowhere'"):
+        script.compile("base.goto nowhere")
+
+
+def test_repeat_counts_and_sets_index(script):
+    assert script.run(
+        "base.import io",
+        "base.repeat 3 i",
+        "io.write i=$i",
+        "base.end",
+    ) == ["i=0", "i=1", "i=2"]
+
+
+def test_repeat_zero_skips_body(script):
+    assert script.run("base.import io", "base.repeat 0", "io.write body", "base.end", "io.write after") == ["after"]
+
+
+def test_nested_break_and_continue_only_leave_the_inner_loop(script):
+    lines = script.run(
+        "base.import io",
+        "base.repeat 2 i",
+        "base.repeat 4 j",
+        "base.if $j == 1 next",
+        "base.if $j == 3 stop",
+        "io.write $i.$j",
+        "base.goto skip",
+        "base.label next",
+        "base.continue",
+        "base.label stop",
+        "base.break",
+        "base.label skip",
+        "base.end",
+        "io.write outer $i",
+        "base.end",
+    )
+    assert lines == ["0.0", "0.2", "outer 0", "1.0", "1.2", "outer 1"]
+
+
+def test_while_loop(script):
+    assert script.run(
+        "base.import io",
+        "base.import math",
+        "io.local N 0",
+        "base.while $N < 3",
+        "math.add $N 1 N",
+        "base.end",
+        "io.write N=$N",
+    ) == ["N=3"]
+
+
+@pytest.mark.parametrize("lines, message", [
+    (("base.end",), "base.end without base.repeat or base.while"),
+    (("base.repeat 2",), "base.repeat without base.end"),
+    (("base.break",), "base.break outside of a loop"),
+])
+def test_unbalanced_loops_are_compile_errors(script, lines, message):
+    with pytest.raises(Exception, match=message):
+        script.compile(*lines)
@@ -0,0 +1,90 @@
+import sys
+import uuid
+
+import pytest
+
+from conftest import Script, capy
+
+SOURCE = '''
+from CapyCompiler import command
+
+
+class greet:
+    @staticmethod
+    def hello(arg):
+        print("hello " + arg)
+
+    @staticmethod
+    @command
+    def double(x: float) -> float:
+        return x * 2
+'''
+
+
+@pytest.fixture
+def module(tmp_path, monkeypatch):
+    # A throwaway modules/<name>.py; `modules` is a namespace package, so a
+    # second modules/ folder on sys.path is searched too
+    name = f"m{uuid.uuid4().hex[:8]}"
+    folder = tmp_path / "modules"
+    folder.mkdir()
+    path = folder / f"{name}.py"
+    path.write_text(SOURCE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield name, path
+    sys.modules.pop(f"modules.{name}", None)
+
+
+def unload(name):
+    del sys.modules[f"modules.{name}"]
+
+
+def test_first_import_loads_the_module_and_writes_a_manifest(script, module):
+    name, path = module
+    script.run(f"base.import {name}")
+    assert f"modules.{name}" in sys.modules
+    assert capy.ModuleRegistry.manifest_path(path).exists()
+    assert not isinstance(script.context.commands["greet.hello"], capy.LazyCommand)
+    assert capy.ModuleRegistry.read_manifest(path) == (("greet.double", True, False), ("greet.hello", False, False))
+
+
+def test_manifest_binds_commands_lazily(script, module):
+    name, path = module
+    script.run(f"base.import {name}")  # writes the manifest
+    unload(name)
+
+    fresh = Script()
+    fresh.run(f"base.import {name}")
+    hello = fresh.context.commands["greet.hello"]
+    assert isinstance(hello, capy.LazyCommand)
+    assert f"modules.{name}" not in sys.modules
+
+    assert fresh.run("greet.hello world") == ["hello world"]
+    assert f"modules.{name}" in sys.modules
+
+
+def test_typed_commands_bind_when_compiled(script, module):
+    name, path = module
+    script.run(f"base.import {name}")
+    unload(name)
+
+    fresh = Script()
+    fresh.run(f"base.import {name}")
+    ins, = fresh.compile("greet.double 4 X")
+    assert f"modules.{name}" in sys.modules  # operand decoding needs the real signature
+    assert not isinstance(ins.handler, capy.LazyCommand)
+    fresh.compiler.execute([ins])
+    assert fresh.registers["X"] == 8.0
+
+
+def test_editing_the_module_invalidates_its_manifest(script, module):
+    name, path = module
+    script.run(f"base.import {name}")
+    assert capy.ModuleRegistry.read_manifest(path) is not None
+    path.write_text(SOURCE + "\n# edited\n")
+    assert capy.ModuleRegistry.read_manifest(path) is None
+
+
+def test_unknown_module_is_an_error(script):
+    with pytest.raises(Exception, match="Module 'no_such_module' not found"):
+        script.compile("base.import no_such_module")
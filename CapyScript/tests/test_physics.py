@@ -0,0 +1,100 @@
+import itertools
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from modules import physics  # noqa: E402 (needs numpy)
+
+
+@pytest.fixture
+def sim(script):
+    script.run("base.import physics")
+    return script
+
+
+def body(sim, index, *fields):
+    sim.run(*(f"physics.get W {field} {index} {field.upper()}" for field in fields))
+    return tuple(sim.registers[field.upper()] for field in fields)
+
+
+def test_gravity_moves_only_bodies_with_mass(sim):
+    sim.run(
+        "physics.world 0 10 W",
+        "physics.add_body W 0 0",
+        "physics.add_body W 5 0 0 0 0",  # mass 0: immovable
+        "physics.step W 0.5 2",
+    )
+    assert body(sim, 0, "y", "vy") == pytest.approx((7.5, 10.0))
+    assert body(sim, 1, "y", "vy") == (0.0, 0.0)
+
+
+def test_head_on_collision_reverses_equal_masses_and_keeps_momentum(sim):
+    sim.run(
+        "physics.world 0 0 0 0 1 W",
+        "physics.add_body W 0 0 1 0",
+        "physics.add_body W 3 0 -1 0",
+        "physics.step W 1",
+    )
+    (x0, vx0), (x1, vx1) = body(sim, 0, "x", "vx"), body(sim, 1, "x", "vx")
+    assert x1 - x0 == pytest.approx(2.0)  # pushed apart to touching
+    assert (vx0, vx1) == pytest.approx((-1.0, 1.0))
+
+
+def test_walls_clamp_and_bounce_with_restitution(sim):
+    sim.run(
+        "physics.world 0 0 100 100 0.5 W",
+        "physics.add_body W 98 50 10 0",
+        "physics.step W 1",
+    )
+    assert body(sim, 0, "x", "vx") == (99.0, -5.0)
+
+
+def test_spatial_hash_finds_every_overlapping_pair():
+    rng = np.random.default_rng(3)
+    pos = rng.uniform(0, 60, (300, 2))
+    radius = rng.uniform(0.5, 2.0, 300)
+    a, b = physics._pairs(pos, radius)
+    found = {tuple(sorted(pair)) for pair in zip(a.tolist(), b.tolist())}
+    assert len(found) == len(a)  # each candidate pair once
+    for i, j in itertools.combinations(range(300), 2):
+        if np.hypot(*(pos[i] - pos[j])) < radius[i] + radius[j]:
+            assert (i, j) in found
+
+
+def test_scatter_get_set_and_clear(sim):
+    sim.run(
+        "physics.world 0 0 200 100 W",
+        "physics.scatter W 50 2 10 7",
+        "physics.get W count N",
+        "physics.get W x XS",
+        "physics.set W 3 mass 0",
+        "physics.get W mass 3 M",
+    )
+    regs = sim.registers
+    xs = np.asarray(regs["XS"].data)
+    assert regs["N"] == 50 and len(xs) == 50
+    assert ((xs >= 2) & (xs <= 198)).all()
+    assert regs["M"] == 0.0
+    assert sim.registers["W"].inv_mass[3] == 0.0
+    sim.run("physics.clear W", "physics.get W count N")
+    assert regs["N"] == 0
+
+
+def test_same_seed_scatters_the_same_world(sim):
+    sim.run("physics.world 0 0 100 100 A", "physics.scatter A 20 1 5 11")
+    sim.run("physics.world 0 0 100 100 B", "physics.scatter B 20 1 5 11")
+    regs = sim.registers
+    assert np.array_equal(regs["A"].pos[:20], regs["B"].pos[:20])
+
+
+@pytest.mark.parametrize("lines, message", [
+    (("physics.world W", "physics.scatter W 10"), "needs a world with a width and height"),
+    (("physics.world W", "physics.step W 0"), "dt must be greater than 0"),
+    (("physics.world W", "physics.get W x 0 X"), "there is no body 0"),
+    (("physics.world W", "physics.get W spin X"), "unknown body field"),
+    (("io.local W 1", "physics.step W 1"), "is not a physics world"),
+])
+def test_errors(sim, lines, message):
+    sim.run("base.import io")
+    with pytest.raises(Exception, match=message):
+        sim.run(*lines)
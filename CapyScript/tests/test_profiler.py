@@ -0,0 +1,102 @@
+import io
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from conftest import capy
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def profiled(script):
+    profiler = script.context.profiler = capy.Profiler()
+    script.compiler.source = "job.capy"
+    # test.nested runs a separately compiled program, like a GUI callback does
+    inner = capy.CapyCompiler(script.context)
+    inner.source = "<callback>"
+    script.run("base.import math", "base.import time")
+    nested = inner.compile_lines(["time.sleep 0.01"])
+    script.context.commands["test.nested"] = lambda arg: capy.CapyCompiler._run(nested)
+    script.run(
+        "base.repeat 3",
+        "math.add 1 2 A",
+        "base.end",
+        "test.nested",
+    )
+    script.context.profiler = None
+    profiler.stop()
+    return profiler
+
+
+def site(profiler, command):
+    return next(s for s in profiler.sites.values() if s.command == command)
+
+
+def test_counts_calls_per_line(profiled):
+    add = site(profiled, "math.add")
+    assert (add.source, add.line, add.calls) == ("job.capy", 2, 3)
+    assert site(profiled, "base.repeat").calls == 1
+
+
+def test_nested_time_is_own_time_of_the_inner_line_only(profiled):
+    outer, inner = site(profiled, "test.nested"), site(profiled, "time.sleep")
+    assert inner.source == "<callback>"
+    assert inner.own >= 0.009
+    assert outer.wall >= inner.wall
+    assert outer.own < inner.own  # the sleep is not charged to the caller twice
+
+
+def test_command_totals_merge_lines(profiled):
+    totals = dict(profiled.commands())
+    assert totals["math.add"][0] == 3
+    assert totals["time.sleep"][0] == 1
+    assert profiled.commands()[0][0] == "time.sleep"  # sorted by own time
+
+
+def test_report_lists_lines_and_commands(profiled):
+    out = io.StringIO()
+    profiled.report(out)
+    text = out.getvalue()
+    assert "commands run" in text
+    assert "job.capy:2 math.add" in text
+    assert "<callback>:1 time.sleep" in text
+
+
+def test_json_output(profiled, tmp_path):
+    path = tmp_path / "profile.json"
+    profiled.write(path, "json")
+    data = json.loads(path.read_text())
+    assert data["wall"] >= data["lines"][0]["own"]
+    assert data["lines"][0]["command"] == "time.sleep"
+    calls = {entry["command"]: entry["calls"] for entry in data["commands"]}
+    assert calls["math.add"] == 3
+
+
+def test_collapsed_stacks_nest_callers(profiled):
+    stacks = dict(line.rsplit(" ", 1) for line in profiled.collapsed())
+    sleep = site(profiled, "time.sleep").name
+    nested = site(profiled, "test.nested").name
+    assert int(stacks[f"{nested};{sleep}"]) >= 9000  # microseconds
+
+
+def test_unprofiled_compile_leaves_plain_instructions(script):
+    ins, = script.compile("base.import math", "math.add 1 2 A")
+    assert type(ins) is capy.Instruction
+
+
+def test_profile_cli_writes_reports(tmp_path):
+    out_json, out_collapsed = tmp_path / "p.json", tmp_path / "p.folded"
+    done = subprocess.run(
+        [sys.executable, str(ROOT / "CapyCompiler.py"), "--profile", "--json", str(out_json),
+         "--collapsed", str(out_collapsed), "--drun", "base.import io; io.write hi"],
+        capture_output=True, text=True, timeout=60,
+    )
+    assert done.returncode == 0, done.stderr
+    assert done.stdout == "hi\n"
+    assert "<drun>:2 io.write" in done.stderr
+    assert json.loads(out_json.read_text())["commands"][0]["command"] == "io.write"
+    assert out_collapsed.exists()
@@ -0,0 +1,99 @@
+import io
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from conftest import capy
+
+ROOT = Path(__file__).resolve().parent.parent
+
+unix_only = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+
+
+def capy_cli(*args, **kwargs):
+    return subprocess.run(
+        [sys.executable, str(ROOT / "CapyCompiler.py"), *args],
+        capture_output=True, text=True, timeout=60, **kwargs,
+    )
+
+
+def test_run_job_returns_status_output_and_registers():
+    out = io.StringIO()
+    result = capy.run_job({"code": "base.import io; base.import math; math.add 1 2 A; io.write $A"}, out)
+    assert result["status"] == 0 and result["error"] is None
+    assert result["registers"] == {"A": "3"}
+    assert out.getvalue() == "3\n"
+
+
+def test_run_job_runs_files_relative_to_cwd(tmp_path):
+    (tmp_path / "job.capy").write_text("base.import io\nio.write from file\n")
+    out = io.StringIO()
+    cwd = os.getcwd()
+    result = capy.run_job({"run": "job.capy", "cwd": str(tmp_path)}, out)
+    assert result["status"] == 0
+    assert out.getvalue() == "from file\n"
+    assert os.getcwd() == cwd
+
+
+def test_run_job_reports_errors_and_keeps_earlier_output():
+    out = io.StringIO()
+    result = capy.run_job({"code": "base.import io; base.import math; io.write before; math.add $NOPE 1 X"}, out)
+    assert result["status"] == 1
+    assert "NOPE" in result["error"]
+    assert out.getvalue() == "before\n"
+    assert capy.run_job({}, io.StringIO())["status"] == 1
+
+
+def test_run_job_starts_each_request_from_a_fresh_context():
+    capy.run_job({"code": "base.import io; io.local LEFTOVER 1"}, io.StringIO())
+    result = capy.run_job({"code": "base.import io"}, io.StringIO())
+    assert "LEFTOVER" not in result["registers"]
+
+
+@unix_only
+def test_serve_and_remote(tmp_path):
+    path = str(tmp_path / "s.sock")
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "CapyCompiler.py"), "--serve", path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        assert "serving on" in server.stdout.readline()
+        env = {**os.environ, "CAPY_SOCKET": path}
+        done = capy_cli("--remote", "--drun", "base.import io; io.write remote hi", env=env)
+        assert (done.returncode, done.stdout) == (0, "remote hi\n")
+        done = capy_cli("--remote", "--drun", "nope.cmd", env=env)
+        assert done.returncode == 1
+        assert "Unknown command" in done.stderr
+
+        # A second server must not take over the live socket
+        second = capy_cli("--serve", path)
+        assert second.returncode == 1
+        assert "already running" in second.stderr
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+@unix_only
+def test_serve_refuses_to_replace_a_regular_file(tmp_path):
+    path = tmp_path / "s.sock"
+    path.write_text("keep me")
+    done = capy_cli("--serve", str(path))
+    assert done.returncode == 1
+    assert "not a socket" in done.stderr
+    assert path.read_text() == "keep me"
+
+
+@unix_only
+def test_stale_socket_is_removed(tmp_path):
+    path = str(tmp_path / "s.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()  # the file stays behind with nothing listening
+    assert capy._remove_stale_socket(path) is None
+    assert not os.path.exists(path)
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_stream_runs_lines_and_loop_blocks(script):
+    assert script.stream(
+        "base.import io",
+        "io.write start",
+        "base.repeat 2 i",
+        "io.write loop $i",
+        "base.end",
+        "io.write end",
+    ) == ["start", "loop 0", "loop 1", "end"]
+
+
+def test_stream_forward_jumps_skip_lines(script):
+    assert script.stream(
+        "base.import io",
+        "io.local A 1",
+        "base.if $A == 1 later",
+        "io.write skipped",
+        "base.label later",
+        "base.goto last",
+        "io.write also skipped",
+        "base.label last",
+        "io.write reached",
+    ) == ["reached"]
+
+
+def test_stream_rejects_backward_jumps(script):
+    with pytest.raises(Exception, match="only forward jumps"):
+        script.stream("base.label top", "base.goto top")
+
+
+def test_stream_reports_unclosed_loop(script):
+    with pytest.raises(Exception, match="base.repeat without base.end"):
+        script.stream("base.repeat 2", "base.import io")
+
+
+def test_stream_runs_each_line_before_reading_the_next(script):
+    seen = []
+
+    def lines():
+        yield "base.import io"
+        yield "io.local A 1"
+        seen.append(dict(script.registers))
+        yield "io.local A 2"
+
+    script.compiler.stream(lines())
+    assert seen == [{"A": "1"}]
+    assert script.registers["A"] == "2"
+
+
+def test_stream_file_reads_a_script_from_disk(script, tmp_path):
+    path = tmp_path / "job.capy"
+    path.write_text("base.import io\nbase.repeat 2 i\nio.write $i\nbase.end\n")
+    script.compiler.stream_file(str(path))
+    assert script.output.getvalue().splitlines() == ["0", "1"]
+
+
+def test_run_dash_streams_stdin():
+    done = subprocess.run(
+        [sys.executable, str(ROOT / "CapyCompiler.py"), "--run", "-"],
+        input="base.import io\nio.write piped\n",
+        capture_output=True, text=True, timeout=60,
+    )
+    assert done.returncode == 0, done.stderr
+    assert done.stdout == "piped\n"
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from conftest import capy
+
+
+@pytest.fixture
+def tasks(script):
+    script.run("base.import io", "base.import math", "base.import time")
+    return script
+
+
+def fail(arg):
+    raise ValueError(f"task failed: {arg}")
+
+
+def test_spawned_tasks_run_concurrently_and_write_the_scripts_registers(tasks):
+    barrier = threading.Barrier(2, timeout=5)
+    tasks.context.commands["test.meet"] = lambda arg: barrier.wait()  # deadlocks if run one at a time
+    tasks.run(
+        "base.spawn T1 test.meet",
+        "base.spawn T2 test.meet",
+        "base.spawn T3 math.add 1 2 A",
+        "base.wait_all",
+    )
+    assert tasks.registers["A"] == 3
+    assert tasks.context.tasks == []
+
+
+def test_await_stores_the_return_value(tasks):
+    tasks.context.commands["test.answer"] = lambda arg: int(arg) * 2
+    tasks.run("base.spawn T test.answer 21", "base.await $T R")
+    assert tasks.registers["R"] == 42
+
+
+def test_await_reraises_the_task_error(tasks):
+    tasks.context.commands["test.fail"] = fail
+    with pytest.raises(ValueError, match="task failed: now"):
+        tasks.run("base.spawn T test.fail now", "base.await $T")
+
+
+def test_wait_all_reraises_the_first_error(tasks):
+    tasks.context.commands["test.fail"] = fail
+    with pytest.raises(ValueError, match="task failed: first"):
+        tasks.run("base.spawn T1 test.fail first", "base.spawn T2 time.sleep 0", "base.wait_all")
+
+
+def test_unawaited_task_errors_surface_when_the_script_ends(tasks):
+    tasks.context.commands["test.fail"] = fail
+    with pytest.raises(ValueError, match="task failed: late"):
+        tasks.run("base.spawn T test.fail late", "io.write done")
+    assert tasks.output.getvalue() == "done\n"
+
+
+@pytest.mark.parametrize("line, message", [
+    ("base.spawn T", "usage: base.spawn"),
+    ("base.spawn T nope.cmd", "Unknown command: nope.cmd"),
+    ("base.spawn T base.goto x", "can't run as a task"),
+    ("base.spawn T capygui.set x y", "must run on the interpreter thread"),
+])
+def test_spawn_rejects_commands_at_compile_time(tasks, line, message):
+    tasks.context.commands["capygui.set"] = lambda arg: None  # without loading the toolkit
+    with pytest.raises(Exception, match=message):
+        tasks.compile(line)
+
+
+def test_await_of_a_non_task_is_an_error(tasks):
+    with pytest.raises(Exception, match="is not a spawned task"):
+        tasks.run("io.local T 1", "base.await $T")
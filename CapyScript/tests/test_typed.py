@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from conftest import capy
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class sample:
+    @staticmethod
+    @capy.command
+    def scale(value: float, factor: float = 2.0) -> float:
+        return value * factor
+
+    @staticmethod
+    @capy.command
+    def join(sep: str, *words: str) -> str:
+        return sep.join(words)
+
+    @staticmethod
+    @capy.command
+    def peek(name: capy.Register) -> object:
+        return name
+
+    @staticmethod
+    @capy.command
+    def flag(on: bool) -> int:
+        return int(on)
+
+
+@pytest.fixture
+def typed(script):
+    script.context.commands.update(capy._exports(sample, "sample"))
+    return script
+
+
+def test_typed_command_converts_operands_and_stores_result(typed):
+    typed.run(
+        "base.import io",
+        "sample.scale 3 A",
+        "sample.scale 3 5 B",
+        "io.local S 4",
+        "sample.scale $S C",
+        "sample.join - x y z D",
+        "sample.peek D E",
+        "sample.flag yes F",
+    )
+    regs = typed.registers
+    assert (regs["A"], regs["B"], regs["C"]) == (6.0, 15.0, 8.0)
+    assert regs["D"] == regs["E"] == "x-y-z"
+    assert regs["F"] == 1
+
+
+def test_literal_operands_are_converted_at_compile_time(typed):
+    ins, = typed.compile("sample.scale 3 A")
+    plan, dest = ins.args
+    assert plan == ((capy._const, 3.0),)
+    assert capy.slot_name(dest) == "A"
+
+
+@pytest.mark.parametrize("line, message", [
+    ("sample.scale abc A", "sample.scale: value must be a number, got 'abc'"),
+    ("sample.scale 1 2 3 A", "expected 1-2 operands and a destination, got 3"),
+    ("sample.scale", "missing destination register"),
+    ("sample.flag maybe F", "on must be true or false"),
+    ("time.sleep abc", "time.sleep: seconds must be a number"),
+])
+def test_bad_operands_fail_at_compile_time(typed, line, message):
+    with pytest.raises(Exception, match=message):
+        typed.compile("base.import time", line)
+
+
+def test_register_operand_reports_undefined_register(typed):
+    with pytest.raises(Exception, match="Register 'NOPE' is undefined"):
+        typed.run("sample.peek NOPE X")
+
+
+def test_spawned_batch_workers_share_the_interpreter_with_modules(tmp_path):
+    # Under spawn the worker loads CapyCompiler.py as __mp_main__; physics'
+    # `from CapyCompiler import ...` must get that copy, not start another
+    pytest.importorskip("numpy")
+    (tmp_path / "sitecustomize.py").write_text("import multiprocessing\nmultiprocessing.set_start_method('spawn')\n")
+    script = tmp_path / "phys.capy"
+    script.write_text("\n".join([
+        "base.import physics",
+        "base.import io",
+        "physics.world 0 0 0 0 W",
+        "physics.add_body W 5 0 1 0",
+        "physics.step W 1",
+        "physics.get W x 0 X",
+        "io.write x=$X",
+    ]))
+    done = subprocess.run(
+        [sys.executable, str(ROOT / "CapyCompiler.py"), "--batch", "--jobs", "1", str(script)],
+        env={**os.environ, "PYTHONPATH": str(tmp_path)},
+        capture_output=True, text=True, timeout=60,
+    )
+    assert done.returncode == 0, done.stdout + done.stderr
+    assert "x=6" in done.stdout
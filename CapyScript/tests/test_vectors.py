@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import capy
+
+
+@pytest.fixture(params=["numpy", "array"])
+def vectors(request, script, monkeypatch):
+    # Every command must work on both storage backends
+    if request.param == "array":
+        monkeypatch.setattr(capy, "np", None)
+    elif capy.np is None:
+        pytest.skip("numpy is not installed")
+    script.run("base.import math", "base.import io")
+    return script
+
+
+def values(vector):
+    return list(vector.data)
+
+
+def test_constructors(vectors):
+    vectors.run("math.vector 1,2,3 A", "math.vrange 3 B", "math.vfill 2 0.5 C")
+    regs = vectors.registers
+    assert [values(regs[name]) for name in "ABC"] == [[1, 2, 3], [0, 1, 2], [0.5, 0.5]]
+
+
+def test_element_wise_and_scalar_operations(vectors):
+    vectors.run(
+        "math.vector 1,2,3 A",
+        "math.vadd $A 10,20,30 B",
+        "math.vmul $A $A C",
+        "math.vscale $A 2 D",
+    )
+    regs = vectors.registers
+    assert values(regs["B"]) == [11, 22, 33]
+    assert values(regs["C"]) == [1, 4, 9]
+    assert values(regs["D"]) == [2, 4, 6]
+    assert values(regs["A"]) == [1, 2, 3]  # operands are not modified
+
+
+def test_reductions_and_element_access(vectors):
+    vectors.run(
+        "math.vector 3,1,2 A",
+        "math.vdot $A 1,1,1 D",
+        "math.vsum $A S",
+        "math.vmin $A LO",
+        "math.vmax $A HI",
+        "math.vlen $A N",
+        "math.vset $A 0 9",
+        "math.vget $A 0 X",
+    )
+    regs = vectors.registers
+    assert (regs["D"], regs["S"], regs["LO"], regs["HI"], regs["N"], regs["X"]) == (6, 6, 1, 3, 3, 9)
+
+
+def test_vectors_print_as_comma_separated_values(vectors):
+    assert vectors.run("math.vector 1,2.5 A", "io.write $A") == ["1.0,2.5"]
+
+
+def test_length_mismatch_is_an_error(vectors):
+    with pytest.raises(Exception):
+        vectors.run("math.vadd 1,2 1,2,3 C")
+
+
+def test_buffer_is_a_view_of_the_data(vectors):
+    vectors.run("math.vector 1,2 A")
+    vector = vectors.registers["A"]
+    view = vector.buffer()
+    view[0] = 7.0
+    assert values(vector) == [7, 2]
@@ -0,0 +1,42 @@
+import pytest
+
+from conftest import capy
+
+
+class FakeList:
+    """Records what capygui.List/Table pass to VirtualList, without a display."""
+
+    def __init__(self, parent, columns=None, command=None, **kw):
+        self.columns, self.command, self.kw = columns, command, kw
+        self.data = None
+
+    def set(self, data):
+        self.data = data
+
+
+@pytest.fixture
+def gui(script, monkeypatch):
+    monkeypatch.setattr(capy, "VirtualList", FakeList)
+    script.run("base.import io")
+    with script.context.activate():
+        yield script
+
+
+@pytest.mark.parametrize("args, columns", [
+    ("app t name,size io.write picked $t", ["name", "size"]),
+    ("app t columns=name,size io.write picked $t", ["name", "size"]),
+])
+def test_table_columns_and_select_command(gui, args, columns):
+    capy.capygui.Table(args)
+    table = gui.context.elements["t"]
+    assert table.columns == columns
+    assert table.command.source == "io.write picked $t"
+
+
+def test_list_takes_source_from_its_register(gui):
+    gui.registers["ITEMS"] = ["a", "b", "c"]
+    capy.capygui.List("app l source=$ITEMS rows=5")
+    widget = gui.context.elements["l"]
+    assert widget.data == ["a", "b", "c"]
+    assert widget.command is None
+    assert widget.kw["rows"] == 5